@@ -1,6 +1,6 @@
 import streamlit as st
 from sqlalchemy import create_engine
-from pymongo import MongoClient
+from app.db.mongo_clients import get_client
 from supabase import create_client
 import streamlit as st
 
@@ -34,7 +34,7 @@ pg_db = settings.PG_DB
 sb_url = settings.SB_URL
 sb_api = settings.SB_API
 
-mongo_client = MongoClient(mongo_uri)
+mongo_client = get_client(mongo_uri)
 mongo_db = mongo_client[mongo_db_name]
 
 
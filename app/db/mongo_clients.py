@@ -0,0 +1,104 @@
+# app/db/mongo_clients.py
+import os
+import logging
+import threading
+import certifi
+import streamlit as st
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+# Jeden rejestr klientów MongoDB na proces, kluczowany URI. MongoClient sam trzyma pulę połączeń
+# i jest bezpieczny wątkowo, więc wszystkie moduły i sesje Streamlit dzielą tego samego klienta
+# zamiast otwierać własne pule i sesje TLS. Klient łączy się leniwie (connect=False) -
+# przy pierwszym zapytaniu, a nie przy imporcie modułu.
+#
+# Jak dotychczasowy klient MongoNewsHandler łączymy się przez TLS z CA z certifi. Wyłączenie jest
+# jawne: tls=false / ssl=false w URI (np. lokalny mongod) albo MONGO_TLS=0 dla całego procesu.
+
+MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 50))
+MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 5 * 60 * 1000))
+SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 30000))
+USE_TLS = os.getenv("MONGO_TLS", "true").lower() not in ("0", "false", "no")
+
+
+def _uses_tls(uri: str) -> bool:
+    lowered = uri.lower()
+    return USE_TLS and "tls=false" not in lowered and "ssl=false" not in lowered
+
+
+class MongoClientRegistry:
+    def __init__(self, max_pool_size: int = MAX_POOL_SIZE, min_pool_size: int = MIN_POOL_SIZE):
+        self.max_pool_size = max_pool_size
+        self.min_pool_size = min_pool_size
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _build(self, uri: str) -> MongoClient:
+        options = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "maxIdleTimeMS": MAX_IDLE_TIME_MS,
+            "serverSelectionTimeoutMS": SERVER_SELECTION_TIMEOUT_MS,
+            "connect": False,
+        }
+        if _uses_tls(uri):
+            options["tls"] = True
+            options["tlsCAFile"] = certifi.where()
+        logging.info(f"[Mongo] Nowy klient (pula: {self.min_pool_size}-{self.max_pool_size} połączeń)")
+        return MongoClient(uri, **options)
+
+    def get_client(self, uri: str) -> MongoClient:
+        if not uri:
+            raise ValueError("Brak URI MongoDB")
+        client = self._clients.get(uri)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(uri)
+                if client is None:
+                    client = self._clients[uri] = self._build(uri)
+        return client
+
+    def ping(self, uri: str) -> bool:
+        """Sprawdza połączenie (komenda ping). Niedziałający klient jest usuwany z rejestru i zamykany."""
+        try:
+            self.get_client(uri).admin.command("ping")
+            return True
+        except PyMongoError as e:
+            logging.warning(f"[Mongo] Ping nieudany: {e}")
+            self.discard(uri)
+            return False
+
+    def discard(self, uri: str) -> None:
+        with self._lock:
+            client = self._clients.pop(uri, None)
+        if client is not None:
+            client.close()
+
+    def close_all(self) -> None:
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
+
+
+@st.cache_resource
+def get_registry() -> MongoClientRegistry:
+    """Rejestr współdzielony przez wszystkie sesje Streamlit (i cały proces poza Streamlit)."""
+    return MongoClientRegistry()
+
+
+def get_client(uri: str) -> MongoClient:
+    return get_registry().get_client(uri)
+
+
+def get_database(uri: str, db_name: str):
+    return get_client(uri)[db_name]
+
+
+def get_collection(uri: str, db_name: str, name: str):
+    return get_database(uri, db_name)[name]
+
+
+def ping(uri: str) -> bool:
+    return get_registry().ping(uri)
@@ -0,0 +1,122 @@
+# app/db/mongo_indexes.py
+import os
+import logging
+import threading
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# Indeksy kolekcji newsów. Zakładane idempotentnie przy starcie (create_indexes nic nie robi,
+# gdy indeks już istnieje), raz na proces dla danej kolekcji.
+#
+# - (ticker, published desc, sentiment): sortowanie po dacie per ticker oraz okna sentymentu
+#   obsługiwane wyłącznie z indeksu (sentiment na końcu klucza = zapytanie pokryte, bez FETCH),
+# - unikalna para (ticker, link): ten sam artykuł nie trafi dwa razy do newsów jednego tickera,
+#   ale może należeć do kilku tickerów,
+# - opcjonalny TTL na published (NEWS_RETENTION_DAYS) do automatycznego usuwania starych newsów.
+
+RETENTION_DAYS = int(os.getenv("NEWS_RETENTION_DAYS", 0)) or None
+
+_ensured = set()
+_ensured_lock = threading.Lock()
+
+
+def news_index_models(retention_days: int | None = RETENTION_DAYS) -> list:
+    models = [
+        IndexModel([("ticker", ASCENDING), ("published", DESCENDING), ("sentiment", ASCENDING)],
+                   name="ticker_published_sentiment"),
+        IndexModel([("ticker", ASCENDING), ("link", ASCENDING)], name="ticker_link_unique", unique=True,
+                   partialFilterExpression={"link": {"$type": "string"}}),
+    ]
+    if retention_days:
+        models.append(IndexModel([("published", ASCENDING)], name="published_ttl",
+                                 expireAfterSeconds=int(retention_days) * 24 * 3600))
+    return models
+
+
+def ensure_news_indexes(collection, retention_days: int | None = RETENTION_DAYS) -> list:
+    """Zakłada indeksy kolekcji newsów; błąd jednego indeksu (np. duplikaty linków) nie blokuje pozostałych."""
+    key = (collection.full_name, retention_days)
+    with _ensured_lock:
+        if key in _ensured:
+            return []
+    created = []
+    for model in news_index_models(retention_days):
+        try:
+            created.extend(collection.create_indexes([model]))
+        except OperationFailure as e:
+            logging.warning(f"[Mongo] Nie udało się założyć indeksu {model.document['name']} "
+                            f"na {collection.full_name}: {e}")
+    with _ensured_lock:
+        _ensured.add(key)
+    logging.info(f"[Mongo] Indeksy {collection.full_name}: {', '.join(created) or 'brak'}")
+    return created
+
+
+def ensure_feed_state_indexes(collection) -> None:
+    try:
+        collection.create_index([("ticker", ASCENDING)], name="ticker_unique", unique=True)
+    except OperationFailure as e:
+        logging.warning(f"[Mongo] Nie udało się założyć indeksu na {collection.full_name}: {e}")
+
+
+def _plan_stages(plan: dict) -> list:
+    """Spłaszcza drzewo planu (winningPlan) do listy nazw etapów."""
+    stages = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        if "stage" in node:
+            stages.append(node["stage"])
+        for child_key in ("inputStage", "queryPlan"):
+            if child_key in node:
+                stack.append(node[child_key])
+        stack.extend(node.get("inputStages", []))
+    return stages
+
+
+def _winning_plans(explain: dict) -> list:
+    plans = []
+    stack = [explain]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if "winningPlan" in node:
+                plans.append(node["winningPlan"])
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return plans
+
+
+def check_news_query_plans(collection, ticker: str = "AAPL", window_days: int = 7) -> dict:
+    """
+    Uruchamia explain() dla gorących zapytań kolekcji newsów i zwraca
+    {nazwa: {"stages": [...], "collscan": bool, "covered": bool}}. Skany kolekcji są logowane.
+    """
+    end = datetime.utcnow()
+    window = {"ticker": {"$in": [ticker]}, "published": {"$gte": end - timedelta(days=window_days), "$lt": end}}
+    explains = {
+        "latest_published": collection.find({"ticker": ticker}).sort("published", DESCENDING).limit(1).explain(),
+        "fetch_news": collection.find({"ticker": {"$in": [ticker]}}).explain(),
+        "sentiment_window": collection.database.command(
+            "explain",
+            {"aggregate": collection.name, "cursor": {},
+             "pipeline": [{"$match": window},
+                          {"$group": {"_id": "$ticker", "average_sentiment": {"$avg": "$sentiment"}}}]},
+            verbosity="queryPlanner"),
+    }
+
+    report = {}
+    for name, explain in explains.items():
+        stages = [stage for plan in _winning_plans(explain) for stage in _plan_stages(plan)]
+        report[name] = {
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+            "covered": bool(stages) and "COLLSCAN" not in stages and "FETCH" not in stages,
+        }
+        if report[name]["collscan"]:
+            logging.warning(f"[Mongo] Zapytanie {name} na {collection.full_name} robi COLLSCAN: {stages}")
+    return report
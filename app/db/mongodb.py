@@ -1,17 +1,23 @@
 # app/db/mongodb.py
 import os
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 import pandas as pd
 import streamlit as st
-from app.news import fetch_news_for_ticker, add_sentiment
-from pymongo import MongoClient, DESCENDING
+from app.news import poll_google_news_rss, FeedState, \
+    get_feed_states, remember_feed_states, published_records
+from app.news_pipeline import NewsPipeline
+from pymongo import DESCENDING, UpdateOne
 from app.config import settings
-from dateutil import parser as date_parser
+from app.db.mongo_clients import get_client
+from app.db.mongo_indexes import ensure_news_indexes, ensure_feed_state_indexes, check_news_query_plans
+from app.db.news_rollup import daily_collection_for, ensure_daily_rollup, rebuild_daily_rollup, read_daily_rollup, \
+    rolling_window_averages, window_days_range
+from app.db.news_writer import upsert_news, prepare_news_collection
 
 
 # --- MongoDB setup ---
-client = MongoClient(settings.mongo_uri)
+client = get_client(settings.mongo_uri)
 mongo_db = client[settings.mongo_db]
 
 
@@ -20,6 +26,22 @@ def get_collection(name: str):
 
 
 news_col = get_collection("news")
+feed_state_col = get_collection("news_feed_state")
+daily_col = daily_collection_for(news_col)
+
+try:
+    ensure_news_indexes(news_col)
+    ensure_feed_state_indexes(feed_state_col)
+    prepare_news_collection(news_col)
+    # rollup budowany z istniejących newsów przy pierwszym starcie, dalej aktualizuje go insert_news
+    ensure_daily_rollup(news_col, daily_col)
+except Exception as e:
+    logging.error(f"Nie udało się przygotować kolekcji MongoDB: {e}")
+
+
+def check_query_plans(ticker: str = "AAPL") -> dict:
+    """Raport explain() dla gorących zapytań kolekcji news (COLLSCAN / zapytania pokryte indeksem)."""
+    return check_news_query_plans(news_col, ticker=ticker)
 
 
 def get_latest_published(ticker: str):
@@ -34,19 +56,24 @@ def insert_news(items: list):
     if not items:
         return
     try:
-        for item in items:
-            if isinstance(item.get("published"), str):
-                try:
-                    item["published"] = date_parser.parse(item["published"])
-                except Exception as e:
-                    item["published"] = None
-                    print(f"Nie udało się sparsować daty: {e}")
-        news_col.insert_many(items)
-        print(f"Wstawiono {len(items)} newsów do MongoDB")
+        published_records(items)
+        inserted = insert_news_batch(items)
+        print(f"Wstawiono {inserted} newsów do MongoDB")
     except Exception as e:
         print("Błąd wstawiania newsów:", e)
 
 
+def insert_news_batch(items: list) -> int:
+    """
+    Zapis paczki: idempotentny upsert po link_hash (app.db.news_writer), więc ponowny import
+    nie dubluje artykułów. Nowe newsy są od razu doliczane do dziennego rollupu news_daily.
+    Zwraca liczbę nowych dokumentów.
+    """
+    if not items:
+        return 0
+    return upsert_news(news_col, items, daily_col=daily_col).inserted
+
+
 def insert_news_df(df: pd.DataFrame):
     """Wstawia datafram z newsami do kolekcji do MongoDB"""
     if df.empty:
@@ -59,93 +86,143 @@ def insert_news_df(df: pd.DataFrame):
         logging.error(f"Błąd wstawiania danych do MongoDB: {e}")
 
 
+def load_feed_states(tickers: list) -> dict:
+    """
+    Stany kanałów RSS dla tickerów: pamięć procesu, potem jedno zapytanie do news_feed_state.
+    Tickery bez zapisanego stanu dostają watermark z najnowszego newsa (jedna agregacja dla wszystkich).
+    """
+    states = get_feed_states(tickers)
+    missing = [t for t in tickers if t not in states]
+    if missing:
+        for doc in feed_state_col.find({"ticker": {"$in": missing}}, {"_id": 0}):
+            states[doc["ticker"]] = FeedState.from_doc(doc)
+        missing = [t for t in missing if t not in states]
+    if missing:
+        latest = news_col.aggregate([
+            {"$match": {"ticker": {"$in": missing}}},
+            {"$group": {"_id": "$ticker", "latest": {"$max": "$published"}}},
+        ])
+        for doc in latest:
+            states[doc["_id"]] = FeedState(ticker=doc["_id"], watermark=doc.get("latest"))
+    remember_feed_states(states.values())
+    return states
+
+
+def save_feed_states(states) -> None:
+    ops = [UpdateOne({"ticker": s.ticker}, {"$set": s.to_doc()}, upsert=True) for s in states]
+    if ops:
+        feed_state_col.bulk_write(ops, ordered=False)
+
+
+def poll_news(tickers: list, limit: int = 10, progress=None) -> int:
+    """
+    Przyrostowo pobiera nowe newsy dla tickerów strumieniowo (NewsPipeline: pobieranie, sentyment
+    i zapis paczkami działają równolegle) i zapisuje stany kanałów. Zwraca liczbę zapisanych newsów.
+    """
+    states = load_feed_states(tickers)
+    updated = {}
+
+    def fetch(ticker):
+        df, updated[ticker] = poll_google_news_rss(ticker, states.get(ticker), limit=limit)
+        return df
+
+    pipeline = NewsPipeline(insert_news_batch, fetch=fetch, progress=progress)
+    written = pipeline.run(tickers)
+    if pipeline.stats["write"].errors or pipeline.stats["score"].errors:
+        # bez zapisu stanów - przy następnym odpytaniu te newsy zostaną pobrane ponownie
+        logging.warning("Błędy zapisu newsów - stany kanałów RSS nie zostały zaktualizowane")
+    else:
+        remember_feed_states(updated.values())
+        save_feed_states(updated.values())
+    logging.info(f"Przyrostowa aktualizacja: {written} nowych newsów dla {len(tickers)} tickerów")
+    return written
+
+
 def update_news_for_ticker(ticker: str):
     """Aktualizuje newsy dla pojedynczego tickera"""
     try:
-        latest_doc = news_col.find_one(
-            {"ticker": ticker},
-            sort=[("published", -1)]
-        )
-
-        latest = None
-        if latest_doc and "published" in latest_doc:
-            latest = pd.to_datetime(latest_doc["published"])
-            # Jeśli jest tz-aware, zmieniamy na tz-naive
-            if latest.tzinfo is not None:
-                latest = latest.tz_convert(None) if hasattr(latest, 'tz_convert') else latest.replace(tzinfo=None)
-
-        # pobieranie newsow
-        df = fetch_news_for_ticker(ticker)
-        if df.empty:
-            logging.info(f"Brak nowych newsów dla {ticker}")
-            return
-
-        # zmiana dat do tz-naive
-        df["published"] = pd.to_datetime(df["published"].apply(
-            lambda x: date_parser.parse(x) if pd.notnull(x) else None
-        ))
-        if df["published"].dt.tz is not None:
-            df["published"] = df["published"].dt.tz_localize(None)
-
-        if latest is not None:
-            df = df[df["published"] > latest]
-
-        if df.empty:
-            logging.info(f"Brak nowych newsów dla {ticker} od {latest}")
-            return
-
-        df = add_sentiment(df)
-
-        records = df.to_dict("records")
-        insert_news(records)
-        logging.info(f"Dodano {len(records)} nowych newsów dla {ticker}")
-
+        poll_news([ticker])
     except Exception as e:
         logging.error(f"Błąd przy aktualizacji newsów dla {ticker}: {e}")
 
 
 def update_all_tickers(tickers: list):
     """Aktualizuje newsy dla listy tickerów"""
-    for i, t in enumerate(tickers, 1):
-        logging.info(f"({i}/{len(tickers)}) Aktualizacja newsów dla {t}")
-        update_news_for_ticker(t)
+    try:
+        poll_news(tickers,
+                  progress=lambda done, total, t: logging.info(f"({done}/{total}) Aktualizacja newsów dla {t}"))
+    except Exception as e:
+        logging.error(f"Błąd przy aktualizacji newsów: {e}")
+
+
+def _window_end(as_of_date) -> datetime:
+    # Upewniamy się, że as_of_date jest obiektem datetime
+    if hasattr(as_of_date, 'to_pydatetime'):  # pd.Timestamp i podobne
+        return as_of_date.to_pydatetime()
+    if isinstance(as_of_date, datetime):
+        return as_of_date
+    return datetime.combine(as_of_date, datetime.min.time())
 
 
 def get_average_sentiment(ticker: str, as_of_date=None, window_days=7):
     """Oblicza średni sentiment dla podanego tickera w danym oknie czasowym."""
+    df = get_average_sentiment_batch([ticker], as_of_date=as_of_date, window_days=window_days)
+    return float(df["avg_sentiment"].iloc[0]) if not df.empty else 0.0
+
+
+def get_average_sentiment_batch(tickers: list, as_of_date=None, window_days=7) -> pd.DataFrame:
+    """
+    Średni sentiment dla wielu tickerów z dziennego rollupu (news_daily) jednym zapytaniem:
+    okno to window_days pełnych dni UTC przed dniem as_of_date (bez bieżącego, niepełnego dnia),
+    bez daty - cała historia.
+    Zwraca DataFrame [ticker, avg_sentiment]; tickery bez newsów w oknie mają 0.0.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    result_df = pd.DataFrame({"ticker": tickers, "avg_sentiment": 0.0})
+    if not tickers:
+        return result_df
     try:
-        # Budujemy bazowy warunek $match
-        match_condition = {"ticker": ticker}
-
-        # Jeśli podano datę, dodajemy filtrowanie po dacie
         if as_of_date:
-            # Upewniamy się, że as_of_date jest obiektem datetime
-            if isinstance(as_of_date, pd.Timestamp):
-                end_date = as_of_date.to_pydatetime()
-            elif hasattr(as_of_date, 'to_pydatetime'):  # np. z pandas
-                end_date = as_of_date.to_pydatetime()
-            else:
-                end_date = datetime.combine(as_of_date, datetime.min.time())
-
-            start_date = end_date - timedelta(days=window_days)
-
-            # Dodajemy warunek daty do zapytania
-            match_condition["published"] = {
-                "$gte": start_date,
-                "$lt": end_date
-            }
-
-        result = news_col.aggregate([
-            {"$match": match_condition},
-            {"$group": {"_id": "$ticker", "average_sentiment": {"$avg": "$sentiment"}}}
-        ])
-
-        avg_sent = 0.0
-        for doc in result:
-            # Jeśli grupa jest pusta, avg zwraca null. Obsługujemy ten przypadek.
-            if doc.get("average_sentiment") is not None:
-                avg_sent = doc["average_sentiment"]
-        return avg_sent
+            end_date = _window_end(as_of_date)
+            averages = rolling_window_averages(
+                read_daily_rollup(daily_col, tickers, *window_days_range(end_date, window_days)),
+                [end_date], window_days)
+        else:
+            daily = read_daily_rollup(daily_col, tickers)
+            grouped = daily.groupby("ticker")[["sum", "count"]].sum()
+            averages = pd.DataFrame({"ticker": grouped.index, "avg_sentiment": grouped["sum"] / grouped["count"]})
+        mapping = dict(zip(averages["ticker"], averages["avg_sentiment"]))
+        result_df["avg_sentiment"] = result_df["ticker"].map(mapping).fillna(0.0).astype(float)
+        return result_df
     except Exception as e:
         st.error(f"Błąd obliczania średniego sentimentu: {e}")
-        return 0.0
\ No newline at end of file
+        return result_df
+
+
+def get_sentiment_history(tickers: list, dates: list, window_days=7) -> pd.DataFrame:
+    """
+    Średni sentiment dla każdego tickera i każdej daty z `dates` (okno window_days pełnych dni UTC przed dniem daty),
+    z jednego odczytu rollupu news_daily i sum prefiksowych po dniach.
+    Zwraca DataFrame [ticker, as_of_date, avg_sentiment].
+    """
+    tickers = list(dict.fromkeys(tickers))
+    dates = sorted(set(dates))
+    columns = ["ticker", "as_of_date", "avg_sentiment"]
+    if not tickers or not dates:
+        return pd.DataFrame(columns=columns)
+    try:
+        ends = [_window_end(d) for d in dates]
+        daily = read_daily_rollup(daily_col, tickers, window_days_range(min(ends), window_days)[0],
+                                  window_days_range(max(ends), window_days)[1])
+    except Exception as e:
+        st.error(f"Błąd obliczania historii sentimentu: {e}")
+        return pd.DataFrame(columns=columns)
+
+    history = rolling_window_averages(daily, ends, window_days)
+    history["as_of_date"] = history["end"].map(dict(zip(ends, dates)))
+    return history[columns]
+
+
+def rebuild_sentiment_rollup(tickers: list | None = None) -> int:
+    """Przelicza news_daily z surowych newsów (np. po ręcznych zmianach w kolekcji news)."""
+    return rebuild_daily_rollup(news_col, daily_col, tickers)
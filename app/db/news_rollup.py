@@ -0,0 +1,170 @@
+# app/db/news_rollup.py
+import logging
+import threading
+from datetime import datetime, timedelta
+import pandas as pd
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import OperationFailure
+
+# Dzienny rollup sentymentu (kolekcja <źródło>_daily, np. news_daily dla news): jeden dokument na
+# (ticker, dzień UTC) z sumą, licznością oraz min/max sentymentu. Aktualizowany przyrostowo przy zapisie
+# newsów, więc średnia z okna N dni to suma co najwyżej N małych dokumentów na ticker, a nie $avg
+# po surowych newsach. Każda kolekcja newsów ma własny rollup; to, że rollup został zbudowany z całej
+# historii swojego źródła, zapisuje znacznik w kolekcji news_rollup_state.
+
+ROLLUP_FIELDS = ["ticker", "day", "sum", "count", "min", "max"]
+STATE_COLLECTION = "news_rollup_state"
+
+_ensured = set()
+_covered = set()
+_ensured_lock = threading.Lock()
+
+
+def daily_collection_for(news_col):
+    """Kolekcja rollupu przypisana do kolekcji newsów (w tej samej bazie)."""
+    return news_col.database[f"{news_col.name}_daily"]
+
+
+def ensure_daily_indexes(daily_col) -> None:
+    """Unikalny indeks (ticker, day) - zakładany raz na proces dla danej kolekcji."""
+    with _ensured_lock:
+        if daily_col.full_name in _ensured:
+            return
+        _ensured.add(daily_col.full_name)
+    try:
+        daily_col.create_index([("ticker", ASCENDING), ("day", ASCENDING)], name="ticker_day_unique", unique=True)
+    except OperationFailure as e:
+        logging.warning(f"[Mongo] Nie udało się założyć indeksu na {daily_col.full_name}: {e}")
+
+
+def _daily_groups(items: list) -> pd.DataFrame:
+    df = pd.DataFrame([{"ticker": i.get("ticker"), "published": i.get("published"), "sentiment": i.get("sentiment")}
+                       for i in items])
+    if df.empty:
+        return df
+    df["published"] = pd.to_datetime(df["published"], errors="coerce")
+    df["sentiment"] = pd.to_numeric(df["sentiment"], errors="coerce")
+    df = df.dropna(subset=["ticker", "published", "sentiment"])
+    if df.empty:
+        return df
+    df["day"] = df["published"].dt.normalize()
+    return df.groupby(["ticker", "day"])["sentiment"].agg(["sum", "count", "min", "max"]).reset_index()
+
+
+def update_daily_rollup(daily_col, items: list) -> int:
+    """Dopisuje nowo zapisane newsy do rollupu ($inc sumy i liczności, $min/$max). Zwraca liczbę dni."""
+    groups = _daily_groups(items)
+    if groups.empty:
+        return 0
+    ops = [
+        UpdateOne({"ticker": row.ticker, "day": row.day.to_pydatetime()},
+                  {"$inc": {"sum": float(row.sum), "count": int(row.count)},
+                   "$min": {"min": float(row.min)}, "$max": {"max": float(row.max)}},
+                  upsert=True)
+        for row in groups.itertuples(index=False)
+    ]
+    daily_col.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def _mark_covered(news_col, daily_col) -> None:
+    daily_col.database[STATE_COLLECTION].update_one(
+        {"_id": daily_col.name},
+        {"$set": {"source": news_col.name, "built_at": datetime.utcnow()}}, upsert=True)
+
+
+def ensure_daily_rollup(news_col, daily_col) -> None:
+    """
+    Raz na proces: indeks rollupu i - gdy brak znacznika pokrycia dla tego źródła - pełna przebudowa
+    z surowych newsów (pierwsze uruchomienie albo rollup zbudowany z innej kolekcji).
+    """
+    ensure_daily_indexes(daily_col)
+    with _ensured_lock:
+        if daily_col.full_name in _covered:
+            return
+    state = daily_col.database[STATE_COLLECTION].find_one({"_id": daily_col.name})
+    if state is None or state.get("source") != news_col.name:
+        rebuild_daily_rollup(news_col, daily_col)
+    with _ensured_lock:
+        _covered.add(daily_col.full_name)
+
+
+def rebuild_daily_rollup(news_col, daily_col, tickers: list | None = None) -> int:
+    """Przelicza rollup od zera z surowych newsów (dla wszystkich albo wybranych tickerów)."""
+    match = {"published": {"$type": "date"}, "sentiment": {"$type": "number"}}
+    if tickers:
+        match["ticker"] = {"$in": list(tickers)}
+        daily_col.delete_many({"ticker": {"$in": list(tickers)}})
+    else:
+        daily_col.delete_many({})
+    news_col.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": {"ticker": "$ticker",
+                    "day": {"$dateFromString": {
+                        "dateString": {"$dateToString": {"format": "%Y-%m-%d", "date": "$published"}}}}},
+            "sum": {"$sum": "$sentiment"}, "count": {"$sum": 1},
+            "min": {"$min": "$sentiment"}, "max": {"$max": "$sentiment"}}},
+        {"$project": {"_id": 0, "ticker": "$_id.ticker", "day": "$_id.day",
+                      "sum": 1, "count": 1, "min": 1, "max": 1}},
+        {"$merge": {"into": daily_col.name, "on": ["ticker", "day"],
+                    "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ])
+    if not tickers:
+        _mark_covered(news_col, daily_col)
+    count = daily_col.count_documents({"ticker": {"$in": list(tickers)}} if tickers else {})
+    logging.info(f"[Mongo] Przebudowano rollup {daily_col.full_name}: {count} dni")
+    return count
+
+
+def window_days_range(end: datetime, window_days: int) -> tuple:
+    """
+    Okno dokładnie `window_days` pełnych dni UTC przed dniem `end`: [dzień(end) - window_days, dzień(end)).
+    Bieżący, niepełny dzień nie wchodzi do okna, więc as_of_date=datetime.now() daje ostatnie 7 dni.
+    """
+    end_day = pd.Timestamp(end).normalize()
+    return (end_day - timedelta(days=window_days)).to_pydatetime(), end_day.to_pydatetime()
+
+
+def read_daily_rollup(daily_col, tickers: list, start: datetime | None = None,
+                      end: datetime | None = None) -> pd.DataFrame:
+    """Dokumenty rollupu dla tickerów z dni w [start, end) -> DataFrame [ticker, day, sum, count, min, max]."""
+    query = {"ticker": {"$in": list(tickers)}}
+    if start is not None or end is not None:
+        query["day"] = {k: v for k, v in (("$gte", start), ("$lt", end)) if v is not None}
+    docs = daily_col.find(query, {"_id": 0, **{f: 1 for f in ROLLUP_FIELDS}})
+    df = pd.DataFrame(list(docs), columns=ROLLUP_FIELDS)
+    if not df.empty:
+        df["day"] = pd.to_datetime(df["day"])
+    return df
+
+
+def rolling_window_averages(daily: pd.DataFrame, ends: list, window_days: int) -> pd.DataFrame:
+    """
+    Średnie z okien window_days_range(end) dla wielu końców okna naraz, z sum prefiksowych
+    po dniach (macierz ticker x dzień). Zwraca DataFrame [ticker, end, avg_sentiment] bez pustych okien.
+    """
+    columns = ["ticker", "end", "avg_sentiment"]
+    if daily.empty or not ends:
+        return pd.DataFrame(columns=columns)
+    days = pd.date_range(daily["day"].min(), max(pd.Timestamp(e) for e in ends).normalize() + pd.Timedelta(days=1))
+    sums = daily.pivot_table(index="day", columns="ticker", values="sum", aggfunc="sum").reindex(days, fill_value=0)
+    counts = daily.pivot_table(index="day", columns="ticker", values="count", aggfunc="sum").reindex(days, fill_value=0)
+    # wiersz i = suma dni < days[i]; pierwszy wiersz zerowy
+    sums = sums.fillna(0).cumsum().shift(1, fill_value=0)
+    counts = counts.fillna(0).cumsum().shift(1, fill_value=0)
+
+    frames = []
+    for end in ends:
+        start_day, end_day = window_days_range(end, window_days)
+        start_idx = days.searchsorted(max(pd.Timestamp(start_day), days[0]))
+        end_idx = min(days.searchsorted(end_day), len(days) - 1)
+        window_sum = sums.iloc[end_idx] - sums.iloc[start_idx]
+        window_count = counts.iloc[end_idx] - counts.iloc[start_idx]
+        has_news = window_count > 0
+        if has_news.any():
+            frames.append(pd.DataFrame({"ticker": window_sum.index[has_news], "end": end,
+                                        "avg_sentiment": (window_sum[has_news] / window_count[has_news]).values}))
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,167 @@
+# app/db/news_writer.py
+import os
+import logging
+import threading
+from dataclasses import dataclass
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from app.news import link_hash
+from app.db.news_rollup import update_daily_rollup
+
+# Idempotentny zapis newsów: bulk_write z nieuporządkowanymi UpdateOne(upsert=True) kluczowanymi
+# hashem (ticker, znormalizowany link). Istniejący artykuł jest tylko "dopasowany" ($setOnInsert nic nie
+# zmienia), więc ponowny import kosztuje wyłącznie nowe artykuły i nie zawyża średnich sentymentu.
+# Ten sam artykuł dla kilku tickerów to osobne dokumenty - każdy ticker ma go w swoich newsach i rollupie.
+
+CHUNK_SIZE = int(os.getenv("NEWS_WRITE_CHUNK_SIZE", 500))
+DUPLICATE_KEY = 11000
+
+_prepared = set()
+_prepared_lock = threading.Lock()
+
+_TRACKING_PARAMS = ("utm_", "oc", "hl", "gl", "ceid")
+
+
+def normalize_link(link) -> str | None:
+    """Link bez fragmentu, parametrów śledzących i końcowego '/', ze schematem i hostem małymi literami."""
+    if not isinstance(link, str) or not link.strip():
+        return None
+    parts = urlsplit(link.strip())
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if not any(k == p or (p.endswith("_") and k.startswith(p)) for p in _TRACKING_PARAMS)]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/"),
+                       urlencode(query), ""))
+
+
+def news_key(item: dict) -> str | None:
+    """Klucz deduplikacji: hash (ticker, znormalizowany link), a bez linku - (ticker, tytuł, data)."""
+    link = normalize_link(item.get("link"))
+    if link is not None:
+        return link_hash(f"{item.get('ticker')}|{link}")
+    # bez linku: ticker + tytuł + data to najlepsze, co mamy
+    if item.get("title"):
+        return link_hash(f"{item.get('ticker')}|{item.get('title')}|{item.get('published')}")
+    return None
+
+
+@dataclass
+class NewsWriteResult:
+    inserted: int = 0
+    matched: int = 0
+    failed: int = 0  # błędy zapisu po stronie MongoDB
+    invalid: int = 0  # rekordy bez linku i tytułu - nie da się ich zdeduplikować
+
+    def __iadd__(self, other: "NewsWriteResult") -> "NewsWriteResult":
+        self.inserted += other.inserted
+        self.matched += other.matched
+        self.failed += other.failed
+        self.invalid += other.invalid
+        return self
+
+    def __str__(self) -> str:
+        return (f"nowe: {self.inserted}, już w bazie: {self.matched}, błędy: {self.failed}, "
+                f"bez klucza: {self.invalid}")
+
+
+class NewsWriteError(RuntimeError):
+    """Część newsów nie została zapisana - wywołujący nie powinien przesuwać stanów kanałów RSS."""
+
+    def __init__(self, result: NewsWriteResult, message: str):
+        super().__init__(f"{result.failed} newsów nie zapisano: {message}")
+        self.result = result
+
+
+def ensure_link_hash_index(collection) -> None:
+    try:
+        collection.create_index([("link_hash", ASCENDING)], name="link_hash_unique", unique=True,
+                                partialFilterExpression={"link_hash": {"$type": "string"}})
+    except OperationFailure as e:
+        logging.warning(f"[Mongo] Nie udało się założyć indeksu link_hash na {collection.full_name}: {e}")
+
+
+def backfill_link_hashes(collection, batch_size: int = CHUNK_SIZE) -> int:
+    """Dopisuje link_hash starszym dokumentom (sprzed upsertów), żeby upsert je rozpoznawał."""
+    updated = 0
+    while True:
+        docs = list(collection.find({"link_hash": {"$exists": False}},
+                                    {"_id": 1, "link": 1, "ticker": 1, "title": 1, "published": 1}).limit(batch_size))
+        if not docs:
+            break
+        ops = [UpdateOne({"_id": d["_id"]}, {"$set": {"link_hash": news_key(d) or str(d["_id"])}}) for d in docs]
+        try:
+            modified = collection.bulk_write(ops, ordered=False).modified_count
+        except BulkWriteError as e:
+            # duplikaty w starych danych: zostają z link_hash = _id, nowe kopie już nie powstaną
+            modified = e.details.get("nModified", 0)
+            dup_ids = [docs[err["index"]]["_id"] for err in e.details.get("writeErrors", [])]
+            modified += collection.bulk_write([UpdateOne({"_id": i}, {"$set": {"link_hash": str(i)}})
+                                               for i in dup_ids], ordered=False).modified_count
+        if not modified:
+            logging.warning(f"[Mongo] Nie udało się uzupełnić link_hash w {collection.full_name}")
+            break
+        updated += modified
+    if updated:
+        logging.info(f"[Mongo] Uzupełniono link_hash w {updated} dokumentach {collection.full_name}")
+    return updated
+
+
+def prepare_news_collection(collection) -> None:
+    """Indeks link_hash i backfill kluczy - raz na proces dla danej kolekcji (backfill skanuje kolekcję)."""
+    with _prepared_lock:
+        if collection.full_name in _prepared:
+            return
+        _prepared.add(collection.full_name)
+    ensure_link_hash_index(collection)
+    backfill_link_hashes(collection)
+
+
+def _write_chunk(collection, chunk: list) -> tuple:
+    ops = [UpdateOne({"link_hash": doc["link_hash"]}, {"$setOnInsert": doc}, upsert=True) for doc in chunk]
+    try:
+        result = collection.bulk_write(ops, ordered=False)
+        upserted = result.upserted_ids or {}
+        return NewsWriteResult(len(upserted), result.matched_count, 0), [chunk[i] for i in upserted], None
+    except BulkWriteError as e:
+        details = e.details
+        errors = details.get("writeErrors", [])
+        # wyścig dwóch upsertów tego samego linku = artykuł już jest
+        duplicates = [err for err in errors if err.get("code") == DUPLICATE_KEY]
+        failures = [err for err in errors if err.get("code") != DUPLICATE_KEY]
+        if failures:
+            logging.warning(f"[Mongo] {len(failures)} newsów nie zapisano: {failures[0].get('errmsg')}")
+        upserted = [chunk[u["index"]] for u in details.get("upserted", [])]
+        result = NewsWriteResult(len(upserted), details.get("nMatched", 0) + len(duplicates), len(failures))
+        return result, upserted, (failures[0].get("errmsg") if failures else None)
+
+
+def upsert_news(collection, items: list, daily_col=None, chunk_size: int = CHUNK_SIZE) -> NewsWriteResult:
+    """
+    Zapisuje newsy paczkami po `chunk_size` (upsert po link_hash, bez kolejności). Rollup news_daily
+    (gdy podano `daily_col`) jest aktualizowany tylko o faktycznie nowe dokumenty.
+    Gdy MongoDB odrzuci część zapisów, po przetworzeniu wszystkich paczek rzuca NewsWriteError.
+    """
+    total = NewsWriteResult()
+    docs = {}
+    for item in items:
+        key = news_key(item)
+        if key is None:
+            total.invalid += 1
+            continue
+        doc = {k: v for k, v in item.items() if k != "_id"}
+        doc["link_hash"] = key
+        docs.setdefault(key, doc)  # duplikaty w obrębie wsadu liczymy jako dopasowane
+    total.matched += len(items) - total.invalid - len(docs)
+
+    docs = list(docs.values())
+    first_error = None
+    for start in range(0, len(docs), chunk_size):
+        result, upserted, error = _write_chunk(collection, docs[start:start + chunk_size])
+        total += result
+        first_error = first_error or error
+        if daily_col is not None and upserted:
+            update_daily_rollup(daily_col, upserted)
+    logging.info(f"[Mongo] Zapis newsów do {collection.full_name}: {total}")
+    if total.failed:
+        raise NewsWriteError(total, first_error)
+    return total
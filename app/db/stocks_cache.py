@@ -0,0 +1,184 @@
+# app/db/stocks_cache.py
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import date, timedelta
+import pandas as pd
+import pyarrow as pa
+from app.db.stocks_loader import MODEL_COLUMNS, NUMERIC_COLUMNS, count_rows_by_day, load_stocks_data, \
+    typed_stocks_frame
+
+# Lokalny, kolumnowy cache historii stocks_data (Arrow IPC), osobny dla każdego projektu Supabase
+# i podzielony na partycje po import_date: <katalog>/<projekt>/import_date=RRRR-MM-DD.arrow.
+# Synchronizacja pobiera tylko dni od najnowszej lokalnej partycji (ta jest zawsze pobierana ponownie,
+# bo import z tego dnia mógł być jeszcze w toku) i zapisuje dzień tylko, gdy liczba wierszy zgadza się
+# z liczbą na serwerze. Dni odrzucone przez tę kontrolę trafiają do pliku _pending.json, a następna
+# synchronizacja zaczyna się od najstarszego z nich. Odczyt mapuje pliki w pamięć, więc ciepły start
+# nie idzie do sieci.
+
+CACHE_DIR = os.getenv("STOCKS_CACHE_DIR", os.path.join("data", "cache", "stocks"))
+SYNC_INTERVAL = int(os.getenv("STOCKS_CACHE_SYNC_INTERVAL", 10 * 60))  # s między synchronizacjami w procesie
+CACHE_COLUMNS = MODEL_COLUMNS
+# Stały schemat partycji - bez niego typy zależą od danych dnia (volume int64 albo double, kolumna
+# samych None jako typ null) i partycje z różnych dni nie dają się połączyć
+CACHE_SCHEMA = pa.schema([
+    (col, pa.float64() if col in NUMERIC_COLUMNS else pa.date32() if col == "import_date" else pa.string())
+    for col in CACHE_COLUMNS
+])
+
+_PREFIX = "import_date="
+_SUFFIX = ".arrow"
+_PENDING = "_pending.json"
+
+_last_sync = {}
+_sync_lock = threading.Lock()
+
+
+def project_key(client) -> str:
+    """Identyfikator projektu Supabase (hash URL-a) - klucz katalogu cache i cache Streamlit."""
+    url = str(getattr(client, "supabase_url", "") or getattr(client, "rest_url", ""))
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+
+
+def _project_dir(client) -> str:
+    return os.path.join(CACHE_DIR, project_key(client))
+
+
+def _partition_path(directory: str, day: date) -> str:
+    return os.path.join(directory, f"{_PREFIX}{day.isoformat()}{_SUFFIX}")
+
+
+def local_days(client) -> list:
+    directory = _project_dir(client)
+    if not os.path.isdir(directory):
+        return []
+    days = []
+    for name in os.listdir(directory):
+        if name.startswith(_PREFIX) and name.endswith(_SUFFIX):
+            try:
+                days.append(date.fromisoformat(name[len(_PREFIX):-len(_SUFFIX)]))
+            except ValueError:
+                continue
+    return sorted(days)
+
+
+def _read_pending(directory: str) -> list:
+    """Dni, które nie przeszły kontroli liczby wierszy i czekają na ponowne pobranie."""
+    try:
+        with open(os.path.join(directory, _PENDING), encoding="utf-8") as f:
+            return sorted(date.fromisoformat(d) for d in json.load(f))
+    except (OSError, ValueError):
+        return []
+
+
+def _write_pending(directory: str, days: list) -> None:
+    path = os.path.join(directory, _PENDING)
+    if not days:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(sorted(d.isoformat() for d in set(days)), f)
+
+
+def _write_partition(directory: str, day: date, df: pd.DataFrame) -> None:
+    table = pa.Table.from_pandas(df[CACHE_COLUMNS], schema=CACHE_SCHEMA, preserve_index=False)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f, pa.ipc.new_file(f, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, _partition_path(directory, day))
+
+
+def sync_stocks_cache(client, history_days: int | None = None, force: bool = False) -> list:
+    """
+    Dociąga do cache dni od najstarszego dnia oczekującego na ponowne pobranie albo od najnowszej
+    lokalnej partycji (łącznie z nią). Przy pustym cache pobiera ostatnie `history_days` dni
+    (albo całą historię). Zwraca listę zapisanych dni.
+    """
+    key = project_key(client)
+    with _sync_lock:
+        if not force and time.monotonic() - _last_sync.get(key, float("-inf")) < SYNC_INTERVAL:
+            return []
+        _last_sync[key] = time.monotonic()
+
+    directory = _project_dir(client)
+    os.makedirs(directory, exist_ok=True)
+    days = local_days(client)
+    pending = _read_pending(directory)
+    if days:
+        start = min([days[-1], *pending])
+    else:
+        start = date.today() - timedelta(days=history_days) if history_days else None
+
+    df = load_stocks_data(client, columns=CACHE_COLUMNS, start_date=start)
+    if df.empty:
+        # na serwerze nie ma już tych dni - nie ma czego ponawiać
+        _write_pending(directory, [])
+        return []
+
+    groups = dict(tuple(df.groupby("import_date")))
+    expected = count_rows_by_day(client, list(groups))
+    written, failed = [], []
+    for day, day_df in groups.items():
+        if expected.get(day) != len(day_df):
+            # dzień zmienił się w trakcie pobierania - następna synchronizacja zacznie się od niego
+            logging.warning(f"[Cache stocks] {day}: pobrano {len(day_df)} wierszy, "
+                            f"na serwerze {expected.get(day)} - pomijam")
+            failed.append(day)
+            continue
+        _write_partition(directory, day, day_df)
+        written.append(day)
+    _write_pending(directory, failed)
+    logging.info(f"[Cache stocks] Zsynchronizowano {len(written)} dni (od {start or 'początku'}), "
+                 f"do ponowienia: {len(failed)}")
+    return written
+
+
+def verify_stocks_cache(client) -> list:
+    """Porównuje liczbę wierszy każdej lokalnej partycji z serwerem i usuwa niezgodne. Zwraca usunięte dni."""
+    directory = _project_dir(client)
+    days = local_days(client)
+    expected = count_rows_by_day(client, days)
+    removed = []
+    for day in days:
+        path = _partition_path(directory, day)
+        with pa.memory_map(path) as source:
+            local_rows = pa.ipc.open_file(source).read_all().num_rows
+        if expected.get(day) != local_rows:
+            os.remove(path)
+            removed.append(day)
+    if removed:
+        # usunięte dni zostaną pobrane ponownie przy następnej synchronizacji
+        _write_pending(directory, _read_pending(directory) + removed)
+        logging.warning(f"[Cache stocks] Usunięto {len(removed)} niezgodnych partycji: {removed}")
+    return removed
+
+
+def read_stocks_cache(client, start_date=None, columns: list | None = None) -> pd.DataFrame:
+    """Czyta partycje od `start_date` (memory-map, bez kopiowania plików do pamięci procesu przed konwersją)."""
+    columns = list(columns or CACHE_COLUMNS)
+    directory = _project_dir(client)
+    start = pd.Timestamp(start_date).date() if start_date is not None else None
+    tables = []
+    for day in local_days(client):
+        if start is not None and day < start:
+            continue
+        with pa.memory_map(_partition_path(directory, day)) as source:
+            # cast także dla partycji zapisanych przed ustaleniem schematu
+            tables.append(pa.ipc.open_file(source).read_all().cast(CACHE_SCHEMA).select(columns))
+    if not tables:
+        return typed_stocks_frame([], columns)
+    return pa.concat_tables(tables).to_pandas()
+
+
+def load_cached_stocks_data(client, days: int, columns: list | None = None) -> pd.DataFrame:
+    """Synchronizuje cache (najwyżej co SYNC_INTERVAL) i zwraca ostatnie `days` dni z dysku."""
+    try:
+        sync_stocks_cache(client, history_days=days)
+    except Exception as e:
+        logging.error(f"[Cache stocks] Synchronizacja nieudana, używam danych lokalnych: {e}")
+    return read_stocks_cache(client, start_date=date.today() - timedelta(days=days), columns=columns)
@@ -0,0 +1,102 @@
+# app/db/stocks_loader.py
+import os
+import logging
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+# Odczyt tabeli stocks_data z Supabase (PostgREST) stronami: tylko potrzebne kolumny, zakres dat
+# po import_date i równoległe zapytania z nagłówkiem Range (.range(od, do)) zamiast jednego
+# select("*"), które jest ucinane przez limit wierszy PostgREST i rośnie z każdym importem.
+
+PAGE_SIZE = int(os.getenv("SUPABASE_PAGE_SIZE", 1000))  # domyślny max-rows PostgREST
+LOADER_CONCURRENCY = int(os.getenv("SUPABASE_LOADER_CONCURRENCY", 4))
+
+# Kolumny używane przez model predykcyjny
+MODEL_COLUMNS = ["ticker", "company", "price", "market_cap", "volume", "change", "p_e", "import_date"]
+NUMERIC_COLUMNS = ["price", "market_cap", "volume", "change", "p_e"]
+
+
+def _filtered(query, start_date=None, end_date=None, after_date=None):
+    if start_date is not None:
+        query = query.gte("import_date", pd.Timestamp(start_date).date().isoformat())
+    if after_date is not None:
+        query = query.gt("import_date", pd.Timestamp(after_date).date().isoformat())
+    if end_date is not None:
+        query = query.lte("import_date", pd.Timestamp(end_date).date().isoformat())
+    return query
+
+
+def count_rows(client, table_name: str = "stocks_data", start_date=None, end_date=None, after_date=None) -> int:
+    query = client.table(table_name).select("id", count="exact", head=True)
+    return _filtered(query, start_date, end_date, after_date).execute().count or 0
+
+
+def count_rows_by_day(client, days: list, table_name: str = "stocks_data",
+                      concurrency: int = LOADER_CONCURRENCY) -> dict:
+    """
+    Liczba wierszy dla każdego dnia z `days` -> {date: liczba}. Jedno zapytanie z agregatem
+    PostgREST (import_date, count()); gdy agregaty są wyłączone na serwerze - zapytania HEAD
+    z count=exact dla poszczególnych dni, `concurrency` naraz.
+    """
+    days = sorted({pd.Timestamp(d).date() for d in days})
+    if not days:
+        return {}
+    try:
+        query = _filtered(client.table(table_name).select("import_date,id.count()"), days[0], days[-1])
+        counts = {pd.Timestamp(row["import_date"]).date(): int(row["count"]) for row in query.execute().data}
+        return {day: counts.get(day, 0) for day in days}
+    except Exception as e:
+        logging.info(f"Supabase: agregaty PostgREST niedostępne ({e}) - liczę wiersze dzień po dniu")
+
+    def count_day(day):
+        return count_rows(client, table_name, start_date=day, end_date=day)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(days)))) as executor:
+        return dict(zip(days, executor.map(count_day, days)))
+
+
+def latest_import_date(client, table_name: str = "stocks_data") -> date | None:
+    response = client.table(table_name).select("import_date").order("import_date", desc=True).limit(1).execute()
+    return pd.Timestamp(response.data[0]["import_date"]).date() if response.data else None
+
+
+def typed_stocks_frame(records: list, columns: list) -> pd.DataFrame:
+    """Rekordy z PostgREST -> DataFrame z typami: kolumny liczbowe jako float64, import_date jako date."""
+    df = pd.DataFrame(records, columns=columns)
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    if "import_date" in df.columns:
+        df["import_date"] = pd.to_datetime(df["import_date"], errors="coerce").dt.date
+    return df
+
+
+def load_stocks_data(client, columns: list | None = None, start_date=None, end_date=None, after_date=None,
+                     table_name: str = "stocks_data", page_size: int = PAGE_SIZE,
+                     concurrency: int = LOADER_CONCURRENCY) -> pd.DataFrame:
+    """
+    Ładuje wiersze stocks_data z zakresu dat: `start_date`/`end_date` (włącznie) albo `after_date`
+    (wyłącznie - "od ostatniego import_date, który już mamy"). Liczba wierszy jest pobierana
+    zapytaniem HEAD z count=exact, a strony po `page_size` idą równolegle (`concurrency` naraz),
+    posortowane po id, więc stronicowanie jest stabilne.
+    """
+    columns = list(columns or MODEL_COLUMNS)
+    total = count_rows(client, table_name, start_date, end_date, after_date)
+    if total == 0:
+        return typed_stocks_frame([], columns)
+
+    select = ",".join(dict.fromkeys(columns))
+
+    def fetch_page(offset: int) -> list:
+        query = _filtered(client.table(table_name).select(select), start_date, end_date, after_date)
+        return query.order("id").range(offset, offset + page_size - 1).execute().data
+
+    offsets = range(0, total, page_size)
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(offsets)))) as executor:
+        pages = list(executor.map(fetch_page, offsets))
+
+    records = [row for page in pages for row in page]
+    logging.info(f"Supabase: pobrano {len(records)}/{total} wierszy {table_name} "
+                 f"({len(offsets)} stron, kolumny: {select})")
+    return typed_stocks_frame(records, columns)
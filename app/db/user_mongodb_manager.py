@@ -1,60 +1,68 @@
 # app/db/user_mongodb_manager.py
-import certifi
 import pandas as pd
-from pymongo import MongoClient
 
-from app.db.mongodb import news_col, get_average_sentiment, get_latest_published, update_news_for_ticker, \
-    update_all_tickers
-from app.news import add_sentiment
+from app.db.mongo_clients import get_client, ping
+
+from app.db.mongodb import news_col, get_average_sentiment_batch, get_latest_published, update_news_for_ticker, \
+    update_all_tickers, get_sentiment_history
+from app.db.mongo_indexes import ensure_news_indexes, check_news_query_plans
+from app.db.news_rollup import daily_collection_for, ensure_daily_rollup
+from app.db.news_writer import upsert_news, prepare_news_collection, NewsWriteError
+from app.news import add_sentiment, published_records
 import streamlit as st
-from dateutil import parser as date_parser
 
 
 class MongoNewsHandler:
     def __init__(self, mongo_uri=None, mongo_db=None, collection_name="news_db"):
-        self.client = MongoClient(mongo_uri, tls=True,
-                                  tlsCAFile=certifi.where(),
-                                  serverSelectionTimeoutMS=30000)
+        # klient z rejestru procesu - kolejne handlery dla tego samego URI dzielą pulę połączeń
+        self.mongo_uri = mongo_uri
+        self.client = get_client(mongo_uri)
         self.db = self.client[mongo_db]
         self.collection = self.db[collection_name]
+        # własny rollup tej kolekcji (np. news_db_daily) - nie mieszamy go z rollupem innych źródeł
+        self.daily_collection = daily_collection_for(self.collection)
+        try:
+            ensure_news_indexes(self.collection)
+            prepare_news_collection(self.collection)
+            ensure_daily_rollup(self.collection, self.daily_collection)
+        except Exception as e:
+            print(f"Nie udało się założyć indeksów MongoDB: {e}")
+
+    def is_healthy(self) -> bool:
+        """Ping do serwera MongoDB"""
+        return ping(self.mongo_uri)
 
     def get_collection(self):
         return self.db["news"]
 
     def fetch_news(self, tickers: list):
         """Pobiera newsy z Mongo dla listy tickerów"""
-        dfs = []
-        for ticker in tickers:
-            docs = list(self.collection.find({"ticker": ticker}))
-            if docs:
-                df = pd.DataFrame(docs)
-                dfs.append(df)
-        if dfs:
-            return pd.concat(dfs, ignore_index=True)
-        return pd.DataFrame()
+        docs = list(self.collection.find({"ticker": {"$in": list(tickers)}}))
+        return pd.DataFrame(docs) if docs else pd.DataFrame()
 
     def insert_news(self, items: list):
         """Wstawia listę newsów do kolekcji news w MongoDB"""
         if not items:
             return 0
         try:
-            for item in items:
-                if isinstance(item.get("published"), str):
-                    try:
-                        item["published"] = date_parser.parse(item["published"])
-                    except Exception as e:
-                        item["published"] = None
-                        print(f"Nie udało się sparsować daty: {e}")
-
-            result = self.collection.insert_many(items)
-            inserted_count = len(result.inserted_ids)
-            print(f"Wstawiono {inserted_count} newsów do MongoDB")
-            return inserted_count
+            published_records(items)
+
+            # upsert po link_hash - artykuły już obecne w bazie nie są dublowane
+            result = upsert_news(self.collection, items, daily_col=self.daily_collection)
+            print(f"Zapis newsów do MongoDB - {result}")
+            return result.inserted
 
+        except NewsWriteError as e:
+            print("Błąd wstawiania newsów:", e)
+            return e.result.inserted
         except Exception as e:
             print("Błąd wstawiania newsów:", e)
             return 0
 
+    def check_query_plans(self, ticker: str = "AAPL") -> dict:
+        """Raport explain() dla gorących zapytań (COLLSCAN / zapytania pokryte indeksem)"""
+        return check_news_query_plans(self.collection, ticker=ticker)
+
     def update_news_for_ticker(self, ticker: str):
         """Aktualizuje newsy dla danego tickera"""
         update_news_for_ticker(ticker)
@@ -69,17 +77,16 @@ class MongoNewsHandler:
 
     @staticmethod
     def get_average_sentiment_for_tickers(tickers: list, as_of_date=None):
-        """Średni sentiment dla listy tickerów -> zawsze DataFrame"""
-        data = []
-        for ticker in tickers:
-            # Przekazujemy datę do funkcji bazowej
-            avg = get_average_sentiment(ticker, as_of_date=as_of_date) or 0
-            data.append({"ticker": ticker, "avg_sentiment": avg})
-        return pd.DataFrame(data)
+        """Średni sentiment dla listy tickerów -> zawsze DataFrame (jedno zapytanie do Mongo)"""
+        return get_average_sentiment_batch(tickers, as_of_date=as_of_date)
+
+    @staticmethod
+    def get_sentiment_history_for_tickers(tickers: list, dates: list):
+        """Średni sentiment dla każdej pary (ticker, data) -> DataFrame [ticker, as_of_date, avg_sentiment]"""
+        return get_sentiment_history(tickers, dates)
 
     @staticmethod
     def get_average_sentiment_for_ticker(ticker: str, as_of_date=None):
         """Średni sentiment dla pojedynczego tickera -> DataFrame"""
         # Przekazujemy datę do funkcji bazowej
-        avg = get_average_sentiment(ticker, as_of_date=as_of_date) or 0
-        return pd.DataFrame([{"ticker": ticker, "avg_sentiment": avg}])
+        return get_average_sentiment_batch([ticker], as_of_date=as_of_date)
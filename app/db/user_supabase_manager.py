@@ -1,13 +1,74 @@
 # app/db/user_supabase_manager.py
+import io
+import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 from datetime import date
 from supabase import create_client, Client
 import streamlit as st
+from app.db.stocks_loader import load_stocks_data
+from app.finviz_values import COLUMN_TYPES, parse_finviz_frame
 from sqlalchemy.engine import URL
 from sqlalchemy import create_engine
 
+STOCKS_DATA_COLUMNS = [
+    "ticker", "company", "sector", "industry", "country",
+    "market_cap", "p_e", "price", "change", "volume", "import_date", "row_hash"
+]
+KEY_COLUMNS = ["ticker", "import_date"]  # jeden wiersz na spółkę i dzień importu
+# Kolumny wchodzące do row_hash - zmiana którejkolwiek oznacza, że wiersz trzeba nadpisać
+HASH_COLUMNS = [c for c in STOCKS_DATA_COLUMNS if c not in KEY_COLUMNS + ["row_hash"]]
+UNIQUE_INDEX = "stocks_data_ticker_import_date_key"
+# Błędy Postgres oznaczające tabelę bez migracji upsertu: brak kolumny (42703) albo brak
+# unikalnego indeksu pasującego do ON CONFLICT (42P10)
+SCHEMA_ERROR_MARKERS = ("42703", "42P10", "PGRST204", "no unique or exclusion constraint", "row_hash")
+DB_COLUMN_TYPES = {col: COLUMN_TYPES[col] for col in ["market_cap", "p_e", "price", "change", "volume"]}
+INTEGER_COLUMNS = ["volume"]  # BIGINT - w CSV bez ".0"
+DB_SESSION_KEYS = ["sb_db_user", "sb_db_password", "sb_db_host", "sb_db_port", "sb_db_name"]
+# Zapis: "auto" - COPY przez bezpośrednie połączenie z Postgres, gdy są dane dostępowe, inaczej PostgREST
+WRITE_MODE = os.getenv("SUPABASE_WRITE_MODE", "auto")
+REST_BATCH_SIZE = 500
+REST_CONCURRENCY = int(os.getenv("SUPABASE_REST_CONCURRENCY", 4))
+
+
+# Migracja istniejących tabel (sprzed upsertu): kolumna row_hash, usunięcie duplikatów
+# (zostaje najnowszy wiersz) i unikalny indeks na (ticker, import_date).
+UPSERT_MIGRATION_SQL = """
+ALTER TABLE public.stocks_data ADD COLUMN IF NOT EXISTS row_hash TEXT;
+
+DELETE FROM public.stocks_data a
+USING public.stocks_data b
+WHERE a.ticker = b.ticker AND a.import_date = b.import_date AND a.id < b.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS stocks_data_ticker_import_date_key
+ON public.stocks_data (ticker, import_date);
+"""
+
+
+class UpsertSchemaError(RuntimeError):
+    """Tabela nie ma kolumny row_hash albo unikalnego indeksu (ticker, import_date)."""
+
+
+def _is_schema_error(error) -> bool:
+    return isinstance(error, UpsertSchemaError) or any(m in str(error) for m in SCHEMA_ERROR_MARKERS)
+
+
+@st.cache_resource
+def _get_engine(db_url: str):
+    """Silnik (z pulą połączeń) współdzielony przez sesje dla danego URL bazy."""
+    return create_engine(db_url, pool_pre_ping=True, pool_size=2, max_overflow=2)
+
+
+def row_hashes(df: pd.DataFrame) -> pd.Series:
+    """Hash treści wiersza (kolumny HASH_COLUMNS obecne w df) jako 16 znaków hex - liczony wektorowo."""
+    columns = [c for c in HASH_COLUMNS if c in df.columns]
+    if df.empty or not columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    hashes = pd.util.hash_pandas_object(df[columns].astype(str), index=False)
+    return hashes.map("{:016x}".format)
+
 
 class SupabaseHandler:
     def __init__(self, url: str, key: str):
@@ -15,12 +76,14 @@ class SupabaseHandler:
             raise ValueError("Supabase URL and Key must be provided.")
         self.client: Client = create_client(url, key)
         self._checked_tables = set()
+        self._engine = None
+        self._upsert_ready = set()
 
     def get_all_tickers_from_supabase(self):
         try:
-            response = self.client.table("stocks_data").select("ticker").execute()
-            tickers = [item["ticker"] for item in response.data]
-            return list(set(tickers))
+            # wszystkie tickery z całej historii, stronami - pojedynczy select jest ucinany przez limit wierszy PostgREST
+            df = load_stocks_data(self.client, columns=["ticker"])
+            return df["ticker"].dropna().unique().tolist()
         except Exception as e:
             st.error(f"Error fetching tickers: {e}")
 
@@ -51,7 +114,7 @@ class SupabaseHandler:
                 port=db_port,
                 database=db_name,
             )
-            engine = create_engine(db_url)
+            engine = _get_engine(db_url.render_as_string(hide_password=False))
             logging.info("Pomyślnie utworzono silnik SQLAlchemy dla Supabase na podstawie danych z sesji.")
             return engine
         except KeyError:
@@ -82,9 +145,14 @@ class SupabaseHandler:
             price NUMERIC,
             change NUMERIC,
             volume BIGINT,
-            import_date DATE
+            import_date DATE,
+            row_hash TEXT
         );
 
+        -- Jeden wiersz na (ticker, import_date) - klucz zapisu typu upsert
+        CREATE UNIQUE INDEX IF NOT EXISTS stocks_data_ticker_import_date_key
+        ON public.stocks_data (ticker, import_date);
+
         -- Włącza mechanizm Row Level Security dla tej tabeli (ważne dla bezpieczeństwa)
         ALTER TABLE public.stocks_data ENABLE ROW LEVEL SECURITY;
 
@@ -145,8 +213,13 @@ class SupabaseHandler:
             price NUMERIC,
             change NUMERIC,
             volume BIGINT,
-            import_date DATE
+            import_date DATE,
+            row_hash TEXT
         );
+
+        -- Jeden wiersz na (ticker, import_date) - klucz zapisu typu upsert
+        CREATE UNIQUE INDEX IF NOT EXISTS stocks_data_ticker_import_date_key
+        ON public.stocks_data (ticker, import_date);
         """
 
         try:
@@ -180,55 +253,227 @@ class SupabaseHandler:
             st.warning("Otrzymano pusty DataFrame. Nic nie zostało zapisane.")
             return 0
 
+        df_to_save = self._prepare_frame(df)
+        st.info(f"Rozpoczynam zapis {len(df_to_save)} rekordów do tabeli '{table_name}'...")
+        saved_count, ok = self._write_frame(df_to_save, table_name, stored={})
+        self._report_saved(saved_count, len(df_to_save) - saved_count if ok else 0, ok, table_name)
+        return saved_count
+
+    def save_dataframes(self, chunks, table_name: str = "stocks_data") -> int:
+        """
+        Zapisuje strumień DataFrame'ów (np. z iter_finviz_pages) porcja po porcji,
+        więc zapis trwa równolegle ze scrapowaniem, a w pamięci jest tylko bieżąca porcja.
+        """
+        try:
+            self._ensure_table_exists(table_name)
+        except RuntimeError as e:
+            logging.error(str(e))
+            return 0
+
+        saved_count, unchanged, ok = 0, 0, True
+        stored = {}  # row_hash z bazy pobierane raz na zapis, wspólne dla wszystkich porcji
+        for chunk in chunks:
+            if chunk is None or chunk.empty:
+                continue
+            df_to_save = self._prepare_frame(chunk, warn=False)
+            chunk_saved, ok = self._write_frame(df_to_save, table_name, stored=stored)
+            saved_count += chunk_saved
+            if not ok:
+                break
+            unchanged += len(df_to_save) - chunk_saved
+
+        self._report_saved(saved_count, unchanged, ok, table_name)
+        return saved_count
+
+    @staticmethod
+    def _report_saved(saved_count: int, unchanged: int, ok: bool, table_name: str) -> None:
+        if saved_count > 0 or (ok and unchanged > 0):
+            skipped = f" Pominięto {unchanged} niezmienionych." if unchanged else ""
+            st.success(f"✅ Zapisano {saved_count} rekordów do tabeli '{table_name}'.{skipped}")
+        else:
+            st.error("❌ Zapis nie powiódł się. Sprawdź komunikaty o błędach powyżej.")
+
+    @staticmethod
+    def _prepare_frame(df: pd.DataFrame, warn: bool = True) -> pd.DataFrame:
+        """
+        Dodaje import_date, odrzuca kolumny spoza tabeli, zostawia ostatni wiersz dla każdego
+        (ticker, import_date) i liczy row_hash z kolumn danych.
+        """
         df_to_save = df.copy()
         df_to_save["import_date"] = date.today().isoformat()
         df_to_save = df_to_save.replace({np.nan: None, pd.NaT: None})
 
-        for col in ["id", "created_at", "idx"]:
+        for col in ["id", "created_at", "idx", "row_hash"]:
             if col in df_to_save.columns:
                 df_to_save.drop(columns=[col], inplace=True)
 
-        valid_columns = [
-            "ticker", "company", "sector", "industry", "country",
-            "market_cap", "p_e", "price", "change", "volume", "import_date"
-        ]
-        existing_cols = [col for col in df_to_save.columns if col in valid_columns]
-        missing_cols = [col for col in valid_columns if col not in df_to_save.columns]
+        existing_cols = [col for col in df_to_save.columns if col in STOCKS_DATA_COLUMNS]
+        missing_cols = [col for col in STOCKS_DATA_COLUMNS if col not in df_to_save.columns and col != "row_hash"]
 
-        if missing_cols:
+        if warn and missing_cols:
             st.warning(f"Brakujące kolumny w DataFrame: {missing_cols} – zostaną pominięte.", icon="⚠️")
-        if extra_cols := [col for col in df_to_save.columns if col not in valid_columns]:
+        if warn and (extra_cols := [col for col in df_to_save.columns if col not in STOCKS_DATA_COLUMNS]):
             st.info(f"Kolumny niewystępujące w bazie ({extra_cols}) zostały automatycznie odrzucone.", icon="ℹ️")
 
         df_to_save = df_to_save[existing_cols]
+        if "ticker" in df_to_save.columns:
+            df_to_save = df_to_save.drop_duplicates(subset=KEY_COLUMNS, keep="last")
+        df_to_save["row_hash"] = row_hashes(df_to_save)
+        return df_to_save
+
+    def _copy_engine(self):
+        """Silnik do COPY albo None, gdy w sesji nie ma danych bezpośredniego połączenia z bazą."""
+        if self._engine is None and all(st.session_state.get(k) for k in DB_SESSION_KEYS):
+            self._engine = self.create_sqlalchemy_engine()
+        return self._engine
+
+    def _write_frame(self, df_to_save: pd.DataFrame, table_name: str, mode: str | None = None,
+                     stored: dict | None = None):
+        """
+        Upsert przygotowanego DataFrame po (ticker, import_date): COPY (gdy możliwe), w razie błędu -
+        równoległe partie PostgREST. Wiersze z niezmienionym row_hash nie są zapisywane.
+        `stored` to cache row_hash z bazy współdzielony przez porcje jednego zapisu.
+        Zwraca (liczba wstawionych lub zaktualizowanych, czy bez błędów).
+        """
+        if df_to_save.empty:
+            return 0, True
+        mode = mode or WRITE_MODE
+        if mode in ("auto", "copy") and (engine := self._copy_engine()) is not None:
+            try:
+                return self._copy_frame(engine, df_to_save, table_name), True
+            except UpsertSchemaError as e:
+                # PostgREST zapisuje do tej samej tabeli - bez migracji też się nie uda
+                self._show_migration_hint(table_name, e)
+                return 0, False
+            except Exception as e:
+                logging.exception("COPY do Postgres nieudany - przełączam na PostgREST.")
+                st.warning(f"Szybki zapis (COPY) nie powiódł się ({e}). Zapisuję przez API Supabase.", icon="⚠️")
+        try:
+            changed = self._changed_rows(df_to_save, table_name, {} if stored is None else stored)
+        except Exception as e:
+            logging.exception("Nie udało się pobrać row_hash z Supabase.")
+            self._show_migration_hint(table_name, e)
+            return 0, False
+        return self._insert_records(changed.to_dict(orient="records"), table_name)
+
+    @staticmethod
+    def _show_migration_hint(table_name: str, error) -> None:
+        st.error(f"Tabela '{table_name}' nie jest gotowa do zapisu typu upsert ({error}). "
+                 "Uruchom poniższą migrację w Supabase SQL Editor.")
+        st.code(UPSERT_MIGRATION_SQL, language="sql")
+
+    def _stored_hashes(self, table_name: str, days: pd.Series, stored: dict) -> pd.MultiIndex:
+        """(ticker, import_date, row_hash) z bazy dla dni z `days` - pobierane raz na zapis dla danego dnia."""
+        for day in sorted(set(days) - {d for (t, d) in stored if t == table_name}):
+            existing = load_stocks_data(self.client, columns=KEY_COLUMNS + ["row_hash"], table_name=table_name,
+                                        start_date=day, end_date=day)
+            stored[(table_name, day)] = pd.MultiIndex.from_arrays(
+                [existing["ticker"], existing["import_date"].astype(str), existing["row_hash"]])
+        indexes = [stored[(table_name, day)] for day in set(days)]
+        return indexes[0].append(indexes[1:]) if indexes else pd.MultiIndex.from_arrays([[], [], []])
+
+    def _changed_rows(self, df_to_save: pd.DataFrame, table_name: str, stored: dict) -> pd.DataFrame:
+        """Odrzuca wiersze, których (ticker, import_date, row_hash) jest już w tabeli."""
+        existing = self._stored_hashes(table_name, df_to_save["import_date"].astype(str), stored)
+        if existing.empty:
+            return df_to_save
+        unchanged = pd.MultiIndex.from_arrays([df_to_save["ticker"], df_to_save["import_date"].astype(str),
+                                               df_to_save["row_hash"]]).isin(existing)
+        logging.info(f"Supabase: {int(unchanged.sum())}/{len(df_to_save)} wierszy bez zmian - pomijam")
+        return df_to_save[~unchanged]
+
+    def _check_upsert_schema(self, cur, table_name: str) -> None:
+        """
+        Sprawdza (raz na tabelę), czy jest kolumna row_hash i unikalny indeks (ticker, import_date).
+        Niczego nie zmienia w tabeli - migrację (z usuwaniem duplikatów) uruchamia użytkownik.
+        """
+        if table_name in self._upsert_ready:
+            return
+        cur.execute("SELECT 1 FROM information_schema.columns "
+                    "WHERE table_schema = 'public' AND table_name = %s AND column_name = 'row_hash'", (table_name,))
+        if cur.fetchone() is None:
+            raise UpsertSchemaError(f"brak kolumny row_hash w {table_name}")
+        cur.execute("SELECT to_regclass(%s)", (f"public.{UNIQUE_INDEX}",))
+        if cur.fetchone()[0] is None:
+            raise UpsertSchemaError(f"brak unikalnego indeksu {UNIQUE_INDEX}")
+        self._upsert_ready.add(table_name)
+
+    def _copy_frame(self, engine, df_to_save: pd.DataFrame, table_name: str) -> int:
+        """
+        Strumieniuje wiersze przez COPY FROM STDIN (CSV) do tymczasowej tabeli stagingowej
+        i scala je jednym INSERT ... ON CONFLICT (ticker, import_date) DO UPDATE w tej samej
+        transakcji - aktualizowane są tylko wiersze o innym row_hash.
+        """
+        columns = list(df_to_save.columns)
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        updates = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in columns if c not in KEY_COLUMNS)
+        staging = f"{table_name}_staging"
+        df_csv = df_to_save.copy()
+        for col in INTEGER_COLUMNS:
+            if col in df_csv.columns:
+                df_csv[col] = pd.to_numeric(df_csv[col], errors="coerce").round().astype("Int64")
+        buffer = io.StringIO()
+        # puste pole CSV bez cudzysłowów = NULL w COPY
+        df_csv.to_csv(buffer, index=False, header=False, na_rep="")
+        buffer.seek(0)
+
+        conn = engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                self._check_upsert_schema(cur, table_name)
+                cur.execute(f'CREATE TEMP TABLE "{staging}" ON COMMIT DROP AS '
+                            f'SELECT {column_list} FROM public."{table_name}" WITH NO DATA')
+                cur.copy_expert(f'COPY "{staging}" ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+                cur.execute(f'INSERT INTO public."{table_name}" AS t ({column_list}) '
+                            f'SELECT {column_list} FROM "{staging}" '
+                            f'ON CONFLICT (ticker, import_date) DO UPDATE SET {updates} '
+                            f'WHERE t.row_hash IS DISTINCT FROM EXCLUDED.row_hash')
+                written = cur.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            self._upsert_ready.discard(table_name)
+            raise
+        finally:
+            conn.close()
+        logging.info(f"COPY: zapisano {written} z {len(df_to_save)} wierszy do {table_name} "
+                     f"({len(df_to_save) - written} bez zmian)")
+        return written
+
+    def _insert_batch(self, chunk: list, table_name: str) -> int:
+        response = self.client.table(table_name).upsert(chunk, on_conflict=",".join(KEY_COLUMNS)).execute()
+        if hasattr(response, "error") and response.error:
+            raise RuntimeError(response.error.message)
+        return len(response.data) if hasattr(response, "data") else 0
+
+    def _insert_records(self, records: list, table_name: str, batch_size: int = REST_BATCH_SIZE,
+                        concurrency: int = REST_CONCURRENCY):
+        """
+        Zapisuje (upsert) rekordy partiami przez PostgREST, do `concurrency` partii naraz. Błąd jednej partii
+        nie zatrzymuje pozostałych. Zwraca (liczba zapisanych, czy bez błędów).
+        """
+        batches = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+        if not batches:
+            return 0, True
 
-        records = df_to_save.to_dict(orient="records")
-        saved_count = 0
-        batch_size = 500
-
-        st.info(f"Rozpoczynam zapis {len(records)} rekordów do tabeli '{table_name}'...")
-
-        for i in range(0, len(records), batch_size):
-            chunk = records[i:i + batch_size]
+        def insert(batch):
             try:
-                response = self.client.table(table_name).insert(chunk).execute()
-                if hasattr(response, "error") and response.error:
-                    st.error(f"Błąd Supabase w trakcie zapisu (batch {i // batch_size + 1}): {response.error.message}")
-                    logging.error(f"Supabase insert error: {response.error}")
-                    break
-                elif hasattr(response, "data"):
-                    saved_count += len(response.data)
+                return self._insert_batch(batch, table_name), None
             except Exception as e:
-                st.error(f"Wystąpił nieoczekiwany błąd podczas zapisu: {e}")
-                logging.exception("Exception during Supabase insert batch.")
-                break
+                logging.exception("Exception during Supabase upsert batch.")
+                return 0, e
 
-        if saved_count > 0:
-            st.success(f"✅ Zapisano {saved_count} rekordów do tabeli '{table_name}'.")
-        else:
-            st.error("❌ Zapis nie powiódł się. Sprawdź komunikaty o błędach powyżej.")
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as executor:
+            results = list(executor.map(insert, batches))
 
-        return saved_count
+        saved_count = sum(saved for saved, _ in results)
+        # komunikaty Streamlit tylko z wątku sesji
+        errors = [(i, e) for i, (_, e) in enumerate(results) if e is not None]
+        for i, e in errors:
+            st.error(f"Błąd Supabase w trakcie zapisu (batch {i + 1}): {e}")
+        if any(_is_schema_error(e) for _, e in errors):
+            self._show_migration_hint(table_name, "brak kolumny row_hash lub unikalnego indeksu (ticker, import_date)")
+        return saved_count, not errors
 
 
 def clean_and_transform_for_db(df: pd.DataFrame) -> pd.DataFrame:
@@ -260,31 +505,18 @@ def clean_and_transform_for_db(df: pd.DataFrame) -> pd.DataFrame:
     }
     df_copy.rename(columns=rename_map, inplace=True)
 
-    # 🔢 Konwersja wartości liczbowych i procentów
-    def clean_numeric(value):
-        if isinstance(value, (int, float)):
-            return value
-        if isinstance(value, str):
-            value = value.strip().replace(',', '')
-            if value.endswith('B'): return float(value[:-1]) * 1e9
-            if value.endswith('M'): return float(value[:-1]) * 1e6
-            if value.endswith('K'): return float(value[:-1]) * 1e3
-            if value.endswith('%'): return float(value[:-1])
-            try:
-                return float(value)
-            except ValueError:
-                return None
-        return None
-
-    for col in ['market_cap', 'p_e', 'price', 'change', 'volume']:
-        if col in df_copy.columns:
-            df_copy[col] = df_copy[col].apply(clean_numeric)
-            if col == 'volume':
-                df_copy[col] = df_copy[col].apply(lambda x: int(x) if x is not None else None)
+    # 🔢 Konwersja wartości liczbowych i procentów (wektorowo; volume od razu jako Int64)
+    df_copy = parse_finviz_frame(df_copy, DB_COLUMN_TYPES)
     df_copy = df_copy.replace({np.nan: None, pd.NaT: None})
     return df_copy
 
 
+def iter_clean_and_transform_for_db(chunks):
+    """Strumieniowa wersja clean_and_transform_for_db dla porcji z iter_finviz_pages."""
+    for chunk in chunks:
+        yield clean_and_transform_for_db(chunk)
+
+
 def create_user(email: str, password: str, sb_url: str, sb_key: str) -> bool:
     """Tworzy nowego użytkownika w systemie uwierzytelniania Supabase."""
     try:
@@ -0,0 +1,75 @@
+# app/finviz_values.py
+import numpy as np
+import pandas as pd
+
+# Wektorowe parsowanie wartości z tabel Finviz ("35.26B", "1,239,904", "-1.24%", "-") na liczby.
+# Cała kolumna jest przetwarzana operacjami .str i mnożnikami NumPy - bez .apply wiersz po wierszu.
+
+MULTIPLIERS = {"K": 1e3, "M": 1e6, "B": 1e9, "T": 1e12}
+
+# Poprawna liczba po zdjęciu sufiksu; reszta ("-", "N/A", pusty tekst) to brak wartości.
+# Walidacja regexem + astype jest kilka razy szybsza niż pd.to_numeric(errors="coerce") na tekście.
+_NUMBER_PATTERN = r"[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?"
+
+NUMBER, PERCENT, INTEGER = "number", "percent", "integer"
+
+# Typy kolumn w nazwach z Finviz i po normalizacji do nazw kolumn bazy
+COLUMN_TYPES = {
+    "Market Cap": NUMBER, "P/E": NUMBER, "Price": NUMBER, "52w High": NUMBER, "52w Low": NUMBER,
+    "Rel Vol": NUMBER, "Avg Volume": INTEGER, "Volume": INTEGER,
+    "Change": PERCENT, "EPS next 5Y": PERCENT, "Perf Week": PERCENT, "Perf Month": PERCENT,
+    "market_cap": NUMBER, "p_e": NUMBER, "price": NUMBER, "volume": INTEGER, "change": PERCENT,
+}
+
+
+def _split_suffix(values) -> tuple:
+    """Tekst bez przecinków i spacji -> (część liczbowa, mnożnik, czy był '%')."""
+    text = pd.Series(values).astype("string").str.strip().str.replace(",", "", regex=False)
+    last = text.str[-1:]
+    multiplier = last.map(MULTIPLIERS).astype("float64")
+    is_percent = (last == "%").fillna(False).to_numpy(dtype=bool)
+    has_suffix = multiplier.notna().to_numpy() | is_percent
+    body = text.where(~has_suffix, text.str[:-1])
+    valid = body.str.fullmatch(_NUMBER_PATTERN).fillna(False).to_numpy(dtype=bool)
+    numbers = body.where(valid).astype("float64").to_numpy(dtype="float64", na_value=np.nan)
+    return numbers, multiplier.fillna(1.0).to_numpy(), is_percent
+
+
+def parse_number(values) -> pd.Series:
+    """Liczby z sufiksami K/M/B/T, '%' i separatorami tysięcy jako float64; '-', puste i błędne -> NaN."""
+    series = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype("float64")
+    numbers, multiplier, _ = _split_suffix(series)
+    return pd.Series(numbers * multiplier, index=series.index, name=series.name)
+
+
+def parse_percent(values, as_fraction: bool = False) -> pd.Series:
+    """Procenty ("-1.24%") jako float64 w punktach procentowych albo, z `as_fraction`, jako ułamek."""
+    parsed = parse_number(values)
+    return parsed / 100.0 if as_fraction else parsed
+
+
+def parse_integer(values) -> pd.Series:
+    """Liczby całkowite (np. wolumen "1,239,904" albo "1.2M") jako Int64 z <NA> dla braków."""
+    return parse_number(values).round().astype("Int64")
+
+
+def parse_finviz_frame(df: pd.DataFrame, column_types: dict | None = None,
+                       percent_as_fraction: bool = False) -> pd.DataFrame:
+    """
+    Zwraca kopię `df` z kolumnami z `column_types` (domyślnie COLUMN_TYPES) sparsowanymi do
+    float64 / Int64. Kolumny, których nie ma w `df`, są pomijane.
+    """
+    column_types = COLUMN_TYPES if column_types is None else column_types
+    parsed = df.copy()
+    for col, kind in column_types.items():
+        if col not in parsed.columns:
+            continue
+        if kind == INTEGER:
+            parsed[col] = parse_integer(parsed[col])
+        elif kind == PERCENT:
+            parsed[col] = parse_percent(parsed[col], as_fraction=percent_as_fraction)
+        else:
+            parsed[col] = parse_number(parsed[col])
+    return parsed
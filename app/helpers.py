@@ -35,9 +35,13 @@ sql_script_help = """
                 price NUMERIC,
                 change NUMERIC,
                 volume BIGINT,
-                import_date DATE
+                import_date DATE,
+                row_hash TEXT
             );
 
+            CREATE UNIQUE INDEX IF NOT EXISTS stocks_data_ticker_import_date_key
+            ON public.stocks_data (ticker, import_date);
+
             ALTER TABLE public.stocks_data ENABLE ROW LEVEL SECURITY;
 
             CREATE POLICY "Allow public read access"
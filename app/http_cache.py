@@ -0,0 +1,186 @@
+# app/http_cache.py
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Dyskowy cache odpowiedzi HTTP współdzielony przez restarty i procesy robocze.
+# Klucz to sha256 z URL-a; treść leży w <klucz>.bin, metadane (status, nagłówki, czas zapisu) w <klucz>.json.
+# TTL zależy od klasy endpointu (screener / quote / rss), a rozmiar katalogu jest ograniczony: przy
+# przekroczeniu usuwamy najdawniej używane wpisy (mtime jest odświeżany przy każdym trafieniu).
+#
+# Tryby (HTTP_CACHE_MODE): "on" - domyślny, "off" - bez cache, "replay" - tylko nagrane odpowiedzi,
+# bez sieci i bez sprawdzania TTL (np. do benchmarków offline).
+
+CACHE_DIR = os.getenv("HTTP_CACHE_DIR", os.path.join("data", "cache", "http"))
+CACHE_MODE = os.getenv("HTTP_CACHE_MODE", "on")
+MAX_CACHE_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# klasa endpointu -> TTL w sekundach. Odpowiedź z cache może być o tyle starsza od zapytania, dlatego
+# ścieżki z bieżącymi cenami (get_current_price(s), alerty) pobierają stronę z use_cache=False, a odpowiedzi
+# z cache niosą czas zapisu w nagłówku CACHE_STORED_AT_HEADER.
+TTLS = {
+    "screener": 10 * 60,
+    "quote": 5 * 60,
+    "rss": 15 * 60,
+}
+
+_STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+CACHE_STORED_AT_HEADER = "X-Cache-Stored-At"  # unix timestamp zapisu wpisu (tylko odpowiedzi z cache)
+
+
+class CacheMiss(requests.ConnectionError):
+    """Brak nagranej odpowiedzi w trybie replay."""
+
+
+def endpoint_class(url: str) -> str | None:
+    if "finviz.com/screener.ashx" in url:
+        return "screener"
+    if "finviz.com/quote.ashx" in url:
+        return "quote"
+    if "news.google.com/rss" in url:
+        return "rss"
+    return None
+
+
+class ResponseCache:
+    def __init__(self, directory: str = CACHE_DIR, mode: str = CACHE_MODE, max_bytes: int = MAX_CACHE_BYTES):
+        self.directory = directory
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replay_only(self) -> bool:
+        return self.mode == "replay"
+
+    def _paths(self, url: str) -> tuple:
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return base + ".bin", base + ".json"
+
+    def get(self, url: str) -> requests.Response | None:
+        """Zwraca odpowiedź z cache albo None (w trybie replay brak wpisu rzuca CacheMiss)."""
+        if not self.enabled:
+            return None
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            ttl = TTLS.get(meta.get("endpoint"), 0)
+            if not self.replay_only and time.time() - meta["stored_at"] > ttl:
+                return None
+            with open(body_path, "rb") as f:
+                body = f.read()
+            os.utime(meta_path)  # LRU: świeży mtime = niedawno używany
+        except (OSError, ValueError, KeyError):
+            if self.replay_only:
+                raise CacheMiss(f"Brak nagranej odpowiedzi dla {url}")
+            return None
+
+        response = requests.Response()
+        response.status_code = meta["status"]
+        response.headers = CaseInsensitiveDict(meta.get("headers", {}))
+        response.headers[CACHE_STORED_AT_HEADER] = str(meta["stored_at"])
+        response.url = url
+        response.encoding = meta.get("encoding")
+        response._content = body
+        return response
+
+    def put(self, url: str, response: requests.Response) -> None:
+        endpoint = endpoint_class(url)
+        if not self.enabled or self.replay_only or endpoint is None or response.status_code != 200:
+            return
+        body_path, meta_path = self._paths(url)
+        meta = {
+            "url": url,
+            "endpoint": endpoint,
+            "status": response.status_code,
+            "encoding": response.encoding,
+            "headers": {h: response.headers[h] for h in _STORED_HEADERS if h in response.headers},
+            "stored_at": time.time(),
+        }
+        try:
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            self._atomic_write(body_path, response.content)
+            self._atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError as e:
+            logging.warning(f"[HTTP cache] Nie udało się zapisać {url}: {e}")
+            return
+        self._account(len(response.content))
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _entries(self) -> list:
+        """(mtime metadanych, rozmiar treści, ścieżka bazowa) dla wszystkich wpisów."""
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for bucket in os.scandir(self.directory):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith(".json"):
+                    base = entry.path[:-len(".json")]
+                    try:
+                        size = os.path.getsize(base + ".bin")
+                    except OSError:
+                        size = 0
+                    entries.append((entry.stat().st_mtime, size, base))
+        return entries
+
+    def _account(self, added_bytes: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += added_bytes
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Usuwa najdawniej używane wpisy, aż cache zejdzie do 80% limitu."""
+        entries = sorted(self._entries())
+        size = sum(s for _, s, _ in entries)
+        target = self.max_bytes * 0.8
+        removed = 0
+        for _, entry_size, base in entries:
+            if size <= target:
+                break
+            for path in (base + ".json", base + ".bin"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            size -= entry_size
+            removed += 1
+        self._size = size
+        logging.info(f"[HTTP cache] Usunięto {removed} wpisów (LRU), rozmiar: {size / 1_000_000:.1f} MB")
+
+    def clear(self) -> None:
+        with self._lock:
+            for _, _, base in self._entries():
+                for path in (base + ".json", base + ".bin"):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            self._size = 0
+
+
+cache = ResponseCache()
@@ -0,0 +1,92 @@
+# app/http_client.py
+import os
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from app.rate_limit import scheduler
+from app.http_cache import cache
+
+# Wspólna sesja HTTP dla scrapera Finviz, notowań i RSS z Google News.
+# Sesja trzyma pule połączeń keep-alive per host, więc kolejne zapytania
+# do tego samego hosta nie płacą ponownie za TCP i handshake TLS.
+
+POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 10))  # ile hostów trzymamy w puli
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 32))  # połączeń keep-alive na jeden host
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 20))
+
+DEFAULT_HEADERS = {
+    "Accept-Encoding": "gzip, deflate",
+    "Connection": "keep-alive",
+}
+
+_session = None
+_session_lock = threading.Lock()
+_config = {
+    "pool_connections": POOL_CONNECTIONS,
+    "pool_maxsize": POOL_MAXSIZE,
+    "timeout": (CONNECT_TIMEOUT, READ_TIMEOUT),
+}
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=_config["pool_connections"], pool_maxsize=_config["pool_maxsize"])
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    logging.info(f"Utworzono sesję HTTP (pule: {_config['pool_connections']}, "
+                 f"połączeń na host: {_config['pool_maxsize']}, timeout: {_config['timeout']})")
+    return session
+
+
+def configure(pool_connections: int | None = None, pool_maxsize: int | None = None,
+              timeout: float | tuple | None = None, cache_mode: str | None = None) -> None:
+    """
+    Zmienia rozmiary pul i timeouty (kolejne zapytanie zbuduje nową sesję)
+    oraz tryb cache odpowiedzi: "on", "off" albo "replay".
+    """
+    global _session
+    if cache_mode is not None:
+        cache.mode = cache_mode
+    with _session_lock:
+        if pool_connections is not None:
+            _config["pool_connections"] = pool_connections
+        if pool_maxsize is not None:
+            _config["pool_maxsize"] = pool_maxsize
+        if timeout is not None:
+            _config["timeout"] = timeout
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get_session() -> requests.Session:
+    """Zwraca współdzieloną (procesową) sesję HTTP."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def get(url: str, headers: dict | None = None, timeout=None, use_cache: bool = True,
+        **kwargs) -> requests.Response:
+    """
+    GET przez współdzieloną sesję z domyślnym timeoutem. Odpowiedzi screenera, stron quote i RSS
+    są najpierw szukane w dyskowym cache (app.http_cache); dane, które muszą być bieżące (ceny),
+    pobieramy z `use_cache=False`. Zapytania sieciowe przechodzą przez
+    harmonogram z app.rate_limit (limit tempa hosta, Retry-After, ponowienia z backoffem).
+    """
+    if use_cache:
+        cached = cache.get(url)
+        if cached is not None:
+            return cached
+
+    response = scheduler.request(get_session().get, url, headers=headers, timeout=timeout or _config["timeout"],
+                                 **kwargs)
+    if use_cache:
+        cache.put(url, response)
+    return response
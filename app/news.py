@@ -1,10 +1,15 @@
 import os
-import requests
+import hashlib
+import threading
 import feedparser
 import pandas as pd
 from urllib.parse import urljoin, quote_plus
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import datetime
+from app import http_client
+from app.sentiment import score_texts
 
 # Te importy mogą powodować błąd cykliczny, jeśli są na górze.
 # Lepiej je przenieść do bloku __main__ lub do funkcji, które ich używają.
@@ -24,79 +29,245 @@ HEADERS = {
     "DNT": "1"
 }
 
-def fetch_google_news_rss(ticker, country='US', lang='en', limit=10):
+# Ile kanałów RSS pobieramy równolegle; tempo i tak ogranicza limit hosta news.google.com (app.rate_limit)
+NEWS_CONCURRENCY = int(os.getenv("NEWS_CONCURRENCY", 8))
+
+
+def _news_rss_url(ticker, country='US', lang='en'):
     q = quote_plus(f"{ticker} stock")
-    rss = f"https://news.google.com/rss/search?q={q}&hl={lang}-{country}&gl={country}&ceid={country}:{lang}"
+    return f"https://news.google.com/rss/search?q={q}&hl={lang}-{country}&gl={country}&ceid={country}:{lang}"
+
+
+def fetch_google_news_rss(ticker, country='US', lang='en', limit=10):
+    rss = _news_rss_url(ticker, country, lang)
     logging.info(f"Pobieram RSS: {rss}")
-    feed = feedparser.parse(rss)
-
-    items = []
-    entries = feed.entries[:limit]
-
-    for e in entries:
-        source = None
-        if 'source' in e:
-            source = e.source.get('title') if isinstance(e.source, dict) else e.get('source')
-        published = e.get('published') or e.get('pubDate') or None
-
-        items.append({
-            "ticker": ticker,
-            "title": e.get("title"),
-            "link": e.get("link"),
-            "source": source,
-            "published": published
-        })
-
-    df = pd.DataFrame(items)
+    response = http_client.get(rss, headers=HEADERS)
+    if response.status_code != 200:
+        logging.warning(f"RSS: HTTP {response.status_code} dla {ticker}")
+        return pd.DataFrame()
+    # feedparser parsuje bajty z pamięci - bez drugiego zapytania i bez plików tymczasowych
+    feed = feedparser.parse(response.content)
+
+    df = _entries_to_df(ticker, feed.entries[:limit])
     logging.info(f"RSS: znaleziono {len(df)} pozycji dla {ticker}")
     return df
 
 
+def _entry_to_item(ticker, e) -> dict:
+    source = None
+    if 'source' in e:
+        source = e.source.get('title') if isinstance(e.source, dict) else e.get('source')
+    published = e.get('published') or e.get('pubDate') or None
+
+    return {
+        "ticker": ticker,
+        "title": e.get("title"),
+        "link": e.get("link"),
+        "source": source,
+        "published": published
+    }
+
+
+def _entries_to_df(ticker, entries) -> pd.DataFrame:
+    df = pd.DataFrame([_entry_to_item(ticker, e) for e in entries])
+    if not df.empty:
+        df["published"] = normalize_published(df["published"], [e.get("published_parsed") for e in entries])
+    return df
+
+
+# Google News podaje daty w RFC-822 ze strefą "GMT"; inne kanały czasem z przesunięciem liczbowym
+RFC822_FORMATS = ("%a, %d %b %Y %H:%M:%S %Z", "%a, %d %b %Y %H:%M:%S %z")
+
+
+def normalize_published(values, parsed=None) -> pd.Series:
+    """
+    Wektorowo zamienia daty publikacji na datetime64 w UTC (tz-naive, jak zapisuje je MongoDB).
+    Gdy podano `parsed` (struktury `published_parsed` z feedparsera, już w UTC), są używane wprost;
+    pozostałe wartości idą przez zbiorcze pd.to_datetime - najpierw znanym formatem RFC-822,
+    a to, czego nie rozpozna, jednym przebiegiem w trybie "mixed". Nierozpoznane daty -> NaT.
+    """
+    values = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+    result = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    if parsed is not None:
+        structs = pd.Series(list(parsed), index=values.index, dtype=object)
+        has_struct = structs.notna()
+        if has_struct.any():
+            result[has_struct] = pd.to_datetime([datetime(*p[:6]) for p in structs[has_struct]])
+
+    pending = result.isna() & values.notna()
+    for fmt in RFC822_FORMATS + ("mixed",):
+        if not pending.any():
+            break
+        converted = pd.to_datetime(values[pending].astype(str), format=fmt, utc=True, errors="coerce")
+        converted = converted[converted.notna()]
+        result[converted.index] = converted.dt.tz_convert(None)
+        pending = result.isna() & values.notna()
+    return result
+
+
+def published_records(items: list) -> list:
+    """Normalizuje `published` w liście rekordów (in-place) do datetime UTC albo None - dla insertów do Mongo."""
+    if items:
+        dated = [item for item in items if "published" in item]
+        published = normalize_published([item["published"] for item in dated])
+        for item, value in zip(dated, published.astype(object)):
+            item["published"] = None if pd.isna(value) else value.to_pydatetime()
+    return items
+
+
+def link_hash(link) -> str:
+    """Stabilny identyfikator newsa (hash GUID/linku) do deduplikacji."""
+    return hashlib.sha1(str(link).encode("utf-8")).hexdigest()
+
+
+# --- Przyrostowe odpytywanie RSS ---
+# Dla każdego tickera trzymamy ETag/Last-Modified kanału, znacznik czasu najnowszego newsa
+# i hashe ostatnio widzianych linków. Zapytanie jest warunkowe (304 = nic nowego), a z kanału
+# bierzemy tylko pozycje, których jeszcze nie mamy - bez parsowania dat i sentymentu dla reszty.
+
+SEEN_LIMIT = 500  # ile ostatnich hashy linków pamiętamy na ticker
+
+
+@dataclass
+class FeedState:
+    ticker: str
+    etag: str | None = None
+    last_modified: str | None = None
+    watermark: datetime | None = None  # najnowszy `published` (UTC, tz-naive)
+    seen: list = field(default_factory=list)
+
+    def to_doc(self) -> dict:
+        return {"ticker": self.ticker, "etag": self.etag, "last_modified": self.last_modified,
+                "watermark": self.watermark, "seen": self.seen[-SEEN_LIMIT:]}
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "FeedState":
+        return cls(ticker=doc["ticker"], etag=doc.get("etag"), last_modified=doc.get("last_modified"),
+                   watermark=doc.get("watermark"), seen=list(doc.get("seen") or []))
+
+
+_feed_states = {}
+_feed_states_lock = threading.Lock()
+
+
+def get_feed_states(tickers) -> dict:
+    """Stany kanałów z pamięci procesu (tylko te tickery, które już znamy)."""
+    with _feed_states_lock:
+        return {t: _feed_states[t] for t in tickers if t in _feed_states}
+
+
+def remember_feed_states(states) -> None:
+    with _feed_states_lock:
+        for state in states:
+            _feed_states[state.ticker] = state
+
+
+def poll_google_news_rss(ticker, state: FeedState | None = None, country='US', lang='en', limit=10):
+    """
+    Warunkowo pobiera kanał RSS i zwraca (DataFrame tylko z nowymi pozycjami, zaktualizowany FeedState).
+    Pomija cache odpowiedzi HTTP - o świeżości decyduje serwer przez ETag/Last-Modified.
+    """
+    state = state or FeedState(ticker)
+    headers = dict(HEADERS)
+    if state.etag:
+        headers["If-None-Match"] = state.etag
+    if state.last_modified:
+        headers["If-Modified-Since"] = state.last_modified
+
+    response = http_client.get(_news_rss_url(ticker, country, lang), headers=headers, use_cache=False)
+    if response.status_code == 304:
+        logging.info(f"RSS: brak zmian dla {ticker} (304)")
+        return pd.DataFrame(), state
+    if response.status_code != 200:
+        logging.warning(f"RSS: HTTP {response.status_code} dla {ticker}")
+        return pd.DataFrame(), state
+
+    feed = feedparser.parse(response.content)
+    seen = set(state.seen)
+    watermark = state.watermark
+    entries, new_hashes = [], []
+    for e in feed.entries[:limit]:
+        key = link_hash(e.get("id") or e.get("link"))
+        if key in seen:
+            continue
+        parsed = e.get("published_parsed")
+        published_at = datetime(*parsed[:6]) if parsed else None
+        if published_at is not None and state.watermark is not None and published_at <= state.watermark:
+            continue
+        seen.add(key)
+        new_hashes.append(key)
+        entries.append(e)
+        if published_at is not None and (watermark is None or published_at > watermark):
+            watermark = published_at
+
+    new_state = FeedState(ticker=ticker,
+                          etag=response.headers.get("ETag") or state.etag,
+                          last_modified=response.headers.get("Last-Modified") or state.last_modified,
+                          watermark=watermark,
+                          seen=(state.seen + new_hashes)[-SEEN_LIMIT:])
+    logging.info(f"RSS: {len(entries)} nowych pozycji dla {ticker}")
+    return _entries_to_df(ticker, entries), new_state
+
+
 def add_sentiment(df, text_col='title'): # <-- ZMIANA 2: Domyślna kolumna to teraz "title"
     if df.empty:
         return df
-    analyzer = SentimentIntensityAnalyzer()
     df = df.copy()
     if text_col in df.columns:
-        df['sentiment'] = df[text_col].fillna("").apply(lambda t: analyzer.polarity_scores(t)['compound'])
+        # wsadowo i z pamięcią wyników - powtarzające się nagłówki liczymy raz (app.sentiment)
+        df['sentiment'] = score_texts(df[text_col].tolist())
     else:
         logging.warning(f"W DataFrame brakuje kolumny '{text_col}' do analizy sentymentu.")
         df['sentiment'] = 0.0
     return df
 
 
-def fetch_news_for_ticker(ticker):
-    """Pobiera i analizuje newsy dla pojedynczego tickera."""
-    try:
-        news_df = fetch_google_news_rss(ticker)
-        if not news_df.empty:
-            # Wywołanie add_sentiment() automatycznie użyje teraz poprawnej kolumny 'title'
-            news_df = add_sentiment(news_df)
-            news_df["ticker"] = ticker
-            return news_df
-    except Exception as e:
-        logging.error(f"Błąd podczas pobierania newsów RSS dla {ticker}: {e}")
+def fetch_news_for_tickers(tickers, limit=10, concurrency=NEWS_CONCURRENCY, with_sentiment=True,
+                           progress=None, country='US', lang='en'):
+    """
+    Pobiera RSS dla wielu tickerów równolegle (co najwyżej `concurrency` zapytań naraz) i zwraca
+    jeden DataFrame. Błąd jednego tickera jest logowany i nie przerywa pozostałych.
+    `progress(done, total, ticker)` jest wołane w wątku wywołującym, więc może aktualizować UI Streamlit.
+    """
+    tickers = list(dict.fromkeys(t for t in tickers if t))
+    if not tickers:
+        return pd.DataFrame()
+
+    frames, failed = [], []
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(tickers)))) as executor:
+        futures = {executor.submit(fetch_google_news_rss, t, country, lang, limit): t for t in tickers}
+        for done, future in enumerate(as_completed(futures), start=1):
+            ticker = futures[future]
+            try:
+                df = future.result()
+                if not df.empty:
+                    frames.append(df)
+            except Exception as e:
+                failed.append(ticker)
+                logging.error(f"Błąd podczas pobierania newsów RSS dla {ticker}: {e}")
+            if progress is not None:
+                progress(done, len(tickers), ticker)
+
+    if failed:
+        logging.warning(f"RSS: nie udało się pobrać newsów dla {len(failed)} tickerów: {', '.join(failed[:20])}")
+    if not frames:
+        return pd.DataFrame()
 
-    logging.info(f"Brak newsów dla {ticker} (RSS)")
-    return pd.DataFrame()
+    news_df = pd.concat(frames, ignore_index=True)
+    logging.info(f"RSS: pobrano {len(news_df)} newsów dla {len(frames)}/{len(tickers)} tickerów")
+    return add_sentiment(news_df) if with_sentiment else news_df
 
 
 if __name__ == "__main__":
     # Importy przeniesione tutaj, aby uniknąć problemów z cyklicznym importem
     from app.save_data import save_news_to_csv
-    from app.stocks import fetch_finviz
+    from app.stocks import fetch_ticker_universe
     from db.mongodb import insert_news_df
 
-    only_tickers_df = fetch_finviz(get_only_tickers=True, with_filters=False, max_companies=50)
-    tickers = only_tickers_df["Ticker"].tolist()
-    all_news = []
-    for t in tickers:
-        news_df = fetch_news_for_ticker(t)
-        if not news_df.empty:
-            all_news.append(news_df)
+    tickers = fetch_ticker_universe(max_tickers=50).tolist()
+    final_df = fetch_news_for_tickers(tickers)
 
-    if all_news:
-        final_df = pd.concat(all_news, ignore_index=True)
+    if not final_df.empty:
         save_news_to_csv(final_df)
         logging.info(f"Pobrano {len(final_df)} newsów dla {len(tickers)} spółek")
 
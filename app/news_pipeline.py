@@ -0,0 +1,149 @@
+# app/news_pipeline.py
+import time
+import queue
+import logging
+import threading
+from dataclasses import dataclass, field
+from app.news import NEWS_CONCURRENCY, add_sentiment, fetch_google_news_rss, published_records
+
+# Strumieniowy import newsów: pobieranie RSS -> sentyment -> zapis, z etapami działającymi równolegle.
+# Etapy łączą ograniczone kolejki, więc wolny zapis wstrzymuje pobieranie (back-pressure),
+# a w pamięci jest najwyżej kilka paczek zamiast całego korpusu.
+
+BATCH_SIZE = 500  # rekordów w jednym zapisie do bazy
+QUEUE_SIZE = 16  # maksymalna liczba elementów czekających między etapami
+
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    name: str
+    items: int = 0
+    errors: int = 0
+    busy: float = 0.0  # s spędzone na pracy (bez czekania na kolejki)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, items: int, seconds: float) -> None:
+        with self.lock:
+            self.items += items
+            self.busy += seconds
+
+    def error(self) -> None:
+        with self.lock:
+            self.errors += 1
+
+    @property
+    def rate(self) -> float:
+        return self.items / self.busy if self.busy else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.items} ({self.rate:.1f}/s pracy, błędy: {self.errors})"
+
+
+class NewsPipeline:
+    """
+    `fetch(ticker) -> DataFrame` działa w `fetch_workers` wątkach, jeden wątek liczy sentyment
+    i składa paczki po `batch_size` rekordów, a `write_batch(records) -> int` zapisuje je w osobnym wątku.
+    """
+
+    def __init__(self, write_batch, fetch=None, fetch_workers: int = NEWS_CONCURRENCY,
+                 batch_size: int = BATCH_SIZE, queue_size: int = QUEUE_SIZE, progress=None):
+        self.write_batch = write_batch
+        self.fetch = fetch or fetch_google_news_rss
+        self.fetch_workers = max(1, fetch_workers)
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.progress = progress
+        self.stats = {name: StageStats(name) for name in ("fetch", "score", "write")}
+        self.written = 0
+
+    def _fetch_worker(self, tickers: queue.Queue, fetched: queue.Queue, total: int, done: list) -> None:
+        stats = self.stats["fetch"]
+        while True:
+            try:
+                ticker = tickers.get_nowait()
+            except queue.Empty:
+                return
+            start = time.perf_counter()
+            try:
+                df = self.fetch(ticker)
+                stats.record(len(df), time.perf_counter() - start)
+                if not df.empty:
+                    fetched.put(df)  # blokuje, gdy sentyment nie nadąża
+            except Exception as e:
+                stats.error()
+                logging.error(f"[Pipeline] Błąd pobierania newsów dla {ticker}: {e}")
+            if self.progress is not None:
+                with stats.lock:
+                    done[0] += 1
+                    count = done[0]
+                self.progress(count, total, ticker)
+
+    def _score_worker(self, fetched: queue.Queue, batches: queue.Queue) -> None:
+        stats = self.stats["score"]
+        batch = []
+        while True:
+            df = fetched.get()
+            if df is _DONE:
+                break
+            start = time.perf_counter()
+            try:
+                records = published_records(add_sentiment(df).to_dict("records"))
+                batch.extend(records)
+                stats.record(len(records), time.perf_counter() - start)
+            except Exception as e:
+                stats.error()
+                logging.error(f"[Pipeline] Błąd liczenia sentymentu: {e}")
+            while len(batch) >= self.batch_size:
+                batches.put(batch[:self.batch_size])
+                batch = batch[self.batch_size:]
+        if batch:
+            batches.put(batch)
+        batches.put(_DONE)
+
+    def _write_worker(self, batches: queue.Queue) -> None:
+        stats = self.stats["write"]
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                return
+            start = time.perf_counter()
+            try:
+                written = self.write_batch(batch) or 0
+                self.written += written
+                stats.record(written, time.perf_counter() - start)
+            except Exception as e:
+                stats.error()
+                logging.error(f"[Pipeline] Błąd zapisu paczki ({len(batch)} rekordów): {e}")
+
+    def run(self, tickers) -> int:
+        """Przetwarza tickery i zwraca liczbę zapisanych newsów."""
+        tickers = list(dict.fromkeys(t for t in tickers if t))
+        if not tickers:
+            return 0
+        ticker_queue = queue.Queue()
+        for t in tickers:
+            ticker_queue.put(t)
+        fetched = queue.Queue(maxsize=self.queue_size)
+        batches = queue.Queue(maxsize=max(1, self.queue_size // 4))
+        done = [0]
+
+        start = time.perf_counter()
+        scorer = threading.Thread(target=self._score_worker, args=(fetched, batches), daemon=True)
+        writer = threading.Thread(target=self._write_worker, args=(batches,), daemon=True)
+        fetchers = [threading.Thread(target=self._fetch_worker, args=(ticker_queue, fetched, len(tickers), done),
+                                     daemon=True)
+                    for _ in range(min(self.fetch_workers, len(tickers)))]
+        for thread in [scorer, writer, *fetchers]:
+            thread.start()
+        for thread in fetchers:
+            thread.join()
+        fetched.put(_DONE)
+        scorer.join()
+        writer.join()
+
+        elapsed = time.perf_counter() - start
+        logging.info(f"[Pipeline] {len(tickers)} tickerów, zapisano {self.written} newsów w {elapsed:.1f}s | "
+                     + " | ".join(str(s) for s in self.stats.values()))
+        return self.written
@@ -6,14 +6,16 @@ from datetime import timedelta, date, datetime
 import streamlit as st
 from pytz import utc
 from sklearn.ensemble import RandomForestClassifier
-from pymongo import MongoClient
 from supabase import create_client, Client
 from postgrest.exceptions import APIError
 import re  # Dodajemy import re do czyszczenia danych
 
 from app.db.user_supabase_manager import clean_and_transform_for_db
 from app.db.user_mongodb_manager import MongoNewsHandler
-from app.stocks import fetch_finviz_for_ticker
+from app.db.mongo_clients import get_collection
+from app.db.stocks_loader import MODEL_COLUMNS
+from app.db.stocks_cache import load_cached_stocks_data
+from app.stocks import fetch_finviz_for_ticker, fetch_finviz_for_tickers
 
 # -------- PARAMETRY MODELU --------
 NEWS_WINDOW_DAYS = 7
@@ -21,30 +23,25 @@ FUTURE_THRESHOLD_PCT = 2.0
 CHANGE_THRESHOLD_PCT = 2.0
 MODEL_N_ESTIMATORS = 300
 MODEL_MAX_DEPTH = 10
+HISTORY_DAYS = 365  # ile dni notowań ładujemy z Supabase
 
 
 def initialize_clients(supabase_url: str, supabase_key: str, mongo_uri: str, mongo_db_name: str):
     supabase_client: Client = create_client(supabase_url, supabase_key)
-    mongo_client = MongoClient(mongo_uri)
-    db = mongo_client[mongo_db_name]
-    news_collection = db["news"]
+    news_collection = get_collection(mongo_uri, mongo_db_name, "news")
 
     return supabase_client, news_collection
 
-@st.cache_data(ttl=3600)
-def load_all_stocks_data(_supabase_client: Client):
-    """Pobiera dane z Supabase i konwertuje je do DataFrame."""
+def load_all_stocks_data(_supabase_client: Client, days: int = HISTORY_DAYS):
+    """
+    Notowania z ostatnich `days` dni z lokalnego cache Arrow (app.db.stocks_cache), osobnego dla
+    projektu Supabase. Z sieci dociągane są tylko nowe dni - przy ciepłym starcie nic.
+    """
     try:
-        resp = _supabase_client.table("stocks_data").select("*").execute()
-        df = pd.DataFrame(resp.data)
+        df = load_cached_stocks_data(_supabase_client, days, columns=MODEL_COLUMNS)
         if df.empty:
             return pd.DataFrame()
 
-        for col in ["price", "market_cap", "volume", "change", "p_e"]:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-        if "import_date" in df.columns:
-            df["import_date"] = pd.to_datetime(df["import_date"], errors='coerce').dt.date
         df.dropna(subset=["ticker", "price", "market_cap"], inplace=True)
         return df
     except APIError as e:
@@ -74,8 +71,11 @@ def create_forward_label(df_all, day, next_day):
 
 
 @st.cache_data(ttl=3600)
-def process_historical_analysis(_supabase_client: Client, _news_collection):
-    """Przetwarza wszystkie dane historyczne i zwraca ranking tickerów."""
+def process_historical_analysis(_supabase_client: Client, _news_collection, project: str | None = None):
+    """
+    Przetwarza wszystkie dane historyczne i zwraca ranking tickerów.
+    `project` (stocks_cache.project_key) rozróżnia w cache Streamlit wyniki różnych projektów Supabase.
+    """
     df_all = load_all_stocks_data(_supabase_client)
     if df_all.empty:
         return pd.DataFrame()
@@ -88,13 +88,15 @@ def process_historical_analysis(_supabase_client: Client, _news_collection):
         return pd.DataFrame()
 
     all_top = []
+    # Sentyment dla wszystkich dni i tickerów jednym zapytaniem zamiast zapytania na ticker i dzień
+    sentiment_history = MongoNewsHandler.get_sentiment_history_for_tickers(
+        df_all["ticker"].unique().tolist(), dates[:-1])
 
     for idx, day in enumerate(dates[:-1]):
         next_day = dates[idx + 1]
         df_day = create_forward_label(df_all, day, next_day)
-        tickers = df_day["ticker"].tolist()
 
-        sentiment_df = MongoNewsHandler.get_average_sentiment_for_tickers(tickers, as_of_date=day)
+        sentiment_df = sentiment_history.loc[sentiment_history["as_of_date"] == day, ["ticker", "avg_sentiment"]]
         df_day = df_day.merge(sentiment_df, on="ticker", how="left").fillna(0)
 
         df_day["market_cap_log"] = np.log1p(df_day["market_cap"])
@@ -227,6 +229,12 @@ def _fetch_and_cache_ticker_data(ticker):
     return fetch_finviz_for_ticker(ticker)
 
 
+@st.cache_data(ttl=1800)
+def _fetch_and_cache_tickers_data(tickers: tuple):
+    """Pobiera i cachuje dane dla listy tickerów (jedno zapytanie do screenera na 20 tickerów)."""
+    return fetch_finviz_for_tickers(list(tickers))
+
+
 def display_top_stocks_card_view():
     """
     Pobiera dane dla listy predefiniowanych, popularnych spółek
@@ -241,6 +249,13 @@ def display_top_stocks_card_view():
     # Ustawienie 4 kolumn
     cols = st.columns(4)
 
+    with st.spinner('Ładuję notowania...'):
+        try:
+            df_all = _fetch_and_cache_tickers_data(tuple(top_tickers))
+        except Exception as e:
+            st.error(f"Błąd pobierania notowań: {e}")
+            df_all = pd.DataFrame()
+
     # Pętla przez listę tickerów
     for i, ticker in enumerate(top_tickers):
         # Wybór kolumny (cyklicznie od 0 do 3)
@@ -249,8 +264,10 @@ def display_top_stocks_card_view():
         with col:
             with st.spinner(f'Ładuję {ticker}...'):
                 try:
-                    # Pobieramy dane z Finviz
-                    df_raw = _fetch_and_cache_ticker_data(ticker)
+                    # Dane ze wspólnego zapytania; pojedynczy quote tylko gdy screener nie zwrócił tickera
+                    df_raw = df_all[df_all["Ticker"] == ticker] if not df_all.empty else df_all
+                    if df_raw.empty:
+                        df_raw = _fetch_and_cache_ticker_data(ticker)
 
                     if df_raw.empty:
                         st.warning(f"Brak danych dla {ticker}")
@@ -0,0 +1,180 @@
+# app/rate_limit.py
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+import requests
+
+# Wspólny harmonogram zapytań HTTP: token bucket na host, obsługa Retry-After,
+# wykładniczy backoff z jitterem i budżet ponowień. Z harmonogramu korzysta http_client.get,
+# więc scraper screenera, ceny i RSS dzielą te same limity dla danego hosta.
+
+# host -> (zapytań na sekundę, maksymalny burst)
+HOST_LIMITS = {
+    "finviz.com": (5.0, 5),
+    "news.google.com": (4.0, 4),
+}
+DEFAULT_LIMIT = (10.0, 10)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5  # s
+BACKOFF_CAP = 30.0  # s
+MIN_RATE_FACTOR = 0.1  # przy throttlingu nie schodzimy poniżej 10% limitu hosta
+
+# Budżet ponowień: każde zapytanie dokłada RETRY_BUDGET_RATIO żetonu, każde ponowienie zabiera 1.
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_MIN = 10
+RETRY_BUDGET_MAX = 100
+
+
+class TokenBucket:
+    """Token bucket z adaptacyjnym tempem (AIMD): 429 obniża tempo o połowę, sukces powoli je przywraca."""
+
+    def __init__(self, rate: float, burst: int):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """Wstrzymuje cały host (np. po Retry-After) i obniża tempo."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.rate = max(self.max_rate * MIN_RATE_FACTOR, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def record_success(self) -> None:
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class RetryBudget:
+    def __init__(self, ratio: float = RETRY_BUDGET_RATIO, minimum: int = RETRY_BUDGET_MIN,
+                 maximum: int = RETRY_BUDGET_MAX):
+        self.ratio = ratio
+        self.maximum = maximum
+        self.balance = float(minimum)
+        self.lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self.lock:
+            self.balance = min(self.maximum, self.balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self.lock:
+            if self.balance >= 1:
+                self.balance -= 1
+                return True
+            return False
+
+
+def _retry_after_seconds(response: requests.Response) -> float | None:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class RequestScheduler:
+    def __init__(self, host_limits: dict | None = None, max_retries: int = MAX_RETRIES):
+        self.host_limits = dict(HOST_LIMITS if host_limits is None else host_limits)
+        self.max_retries = max_retries
+        self.budget = RetryBudget()
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _limit_for(self, host: str) -> tuple:
+        for domain, limit in self.host_limits.items():
+            if host == domain or host.endswith("." + domain):
+                return limit
+        return DEFAULT_LIMIT
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(*self._limit_for(host))
+            return self._buckets[host]
+
+    def configure_host(self, host: str, rate: float, burst: int) -> None:
+        with self._lock:
+            self.host_limits[host] = (rate, burst)
+            self._buckets = {h: b for h, b in self._buckets.items() if h != host and not h.endswith("." + host)}
+
+    def request(self, send, url: str, **kwargs) -> requests.Response:
+        """
+        Wykonuje `send(url, **kwargs)` z limitem tempa hosta i ponowieniami.
+        Zwraca ostatnią odpowiedź (także 429/5xx, gdy skończą się próby lub budżet);
+        błędy sieciowe są rzucane dopiero po wyczerpaniu prób.
+        """
+        host = urlsplit(url).hostname or ""
+        bucket = self.bucket(host)
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            bucket.acquire()
+            try:
+                response = send(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries or not self.budget.withdraw():
+                    raise
+                delay = _backoff(attempt)
+                logging.warning(f"[HTTP] {host}: {e.__class__.__name__}, ponawiam za {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            if response.status_code not in RETRY_STATUSES:
+                bucket.record_success()
+                return response
+            if attempt >= self.max_retries or not self.budget.withdraw():
+                logging.error(f"[HTTP] {host}: HTTP {response.status_code} po {attempt + 1} próbach: {url}")
+                return response
+
+            delay = _backoff(attempt)
+            retry_after = _retry_after_seconds(response)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            if response.status_code == 429 or retry_after is not None:
+                bucket.pause(delay)
+            logging.warning(f"[HTTP] {host}: HTTP {response.status_code}, ponawiam za {delay:.1f}s "
+                            f"(próba {attempt + 1}/{self.max_retries})")
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+
+scheduler = RequestScheduler()
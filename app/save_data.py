@@ -5,69 +5,54 @@ import logging
 from datetime import datetime
 import streamlit as st
 from app.db.supabase_manager import *
+from app.finviz_values import COLUMN_TYPES, parse_finviz_frame, parse_number
 
 
 
 def convert_market_cap(value):
     """Bezpiecznie konwertuje string z kapitalizacją rynkową na liczbę float."""
-    if pd.isna(value):
-        return None
-    value = str(value).strip()
-    try:
-        if value.endswith('B'):
-            return float(value[:-1]) * 1_000_000_000
-        elif value.endswith('M'):
-            return float(value[:-1]) * 1_000_000
-        elif value.endswith('K'):
-            return float(value[:-1]) * 1_000
-        else:
-            return float(value)
-    except (ValueError, TypeError):
-        return None
+    parsed = parse_number([value]).iloc[0]
+    return None if pd.isna(parsed) else float(parsed)
 
 
-def save_stocks_to_csv(df: pd.DataFrame, get_only_tickers=False, with_filters=False) -> None:
-    """
-    Inteligentnie zapisuje dane giełdowe do CSV, obsługując tryb pełny i 'tylko tickery'.
-    """
-    if df is None or df.empty:
-        logging.warning("Otrzymano pusty DataFrame. Pomijam zapis do pliku.")
-        return
+# Kolumny CSV parsowane w jednym przebiegu; "Market Cap" zostaje tekstem obok market_cap_numeric
+CSV_COLUMN_TYPES = {col: kind for col, kind in COLUMN_TYPES.items() if col[0].isupper() and col != "Market Cap"}
+
+
+def _prepare_stocks_for_csv(df: pd.DataFrame, get_only_tickers=False, with_filters=False):
+    """Zwraca (katalog, nazwa pliku, DataFrame do zapisu) dla danych giełdowych."""
     today_str = datetime.now().strftime("%Y%m%d")
 
     if get_only_tickers:
-        logging.info("Tryb 'Tylko tickery'. Zapisywanie uproszczonych danych.")
-
         path_dir = os.path.join("data", "tickers", today_str)
         filename_suffix = f"finviz_{'filtered_' if with_filters else ''}tickers_{today_str}.csv"
 
         df_to_save = df[["No", "Ticker"]].copy()
 
     else:
-        logging.info("Tryb pełnych danych. Przetwarzanie i zapisywanie szczegółowych informacji.")
-
         path_dir = os.path.join("data", "stocks", today_str)
         filename_suffix = f"finviz_{'filtered_' if with_filters else ''}stocks_{today_str}.csv"
-        df_to_save = df.copy()
+        df_to_save = parse_finviz_frame(df, CSV_COLUMN_TYPES, percent_as_fraction=True)
         if "Market Cap" in df_to_save.columns:
-            logging.info(f"Kolumny w DataFrame: {df_to_save.columns.tolist()}")
-            logging.info(
-                f"Pierwsze 5 wartości 'Market Cap' (przed konwersją): {df_to_save['Market Cap'].head().tolist()}")
-            df_to_save['market_cap_numeric'] = df_to_save['Market Cap'].apply(convert_market_cap)
-            logging.info(
-                f"Pierwsze 5 wartości 'market_cap_numeric' (po konwersji): {df_to_save['market_cap_numeric'].head().tolist()}")
-
-        numeric_cols = ["Price", "Volume", "52w High", "52w Low", "P/E", "Rel Vol"]
-        for col in numeric_cols:
-            if col in df_to_save.columns:
-                df_to_save[col] = pd.to_numeric(df_to_save[col].astype(str).str.replace(",", "", regex=False),
-                                                errors="coerce")
-
-        percent_cols = ["EPS next 5Y", "Perf Week", "Perf Month", "Change"]
-        for col in percent_cols:
-            if col in df_to_save.columns:
-                df_to_save[col] = pd.to_numeric(df_to_save[col].astype(str).str.replace("%", "", regex=False),
-                                                errors="coerce") / 100.0
+            df_to_save['market_cap_numeric'] = parse_number(df_to_save['Market Cap'])
+
+    return path_dir, filename_suffix, df_to_save
+
+
+def save_stocks_to_csv(df: pd.DataFrame, get_only_tickers=False, with_filters=False) -> None:
+    """
+    Inteligentnie zapisuje dane giełdowe do CSV, obsługując tryb pełny i 'tylko tickery'.
+    """
+    if df is None or df.empty:
+        logging.warning("Otrzymano pusty DataFrame. Pomijam zapis do pliku.")
+        return
+
+    if get_only_tickers:
+        logging.info("Tryb 'Tylko tickery'. Zapisywanie uproszczonych danych.")
+    else:
+        logging.info("Tryb pełnych danych. Przetwarzanie i zapisywanie szczegółowych informacji.")
+        logging.info(f"Kolumny w DataFrame: {df.columns.tolist()}")
+    path_dir, filename_suffix, df_to_save = _prepare_stocks_for_csv(df, get_only_tickers, with_filters)
 
     try:
         os.makedirs(path_dir, exist_ok=True)
@@ -82,6 +67,37 @@ def save_stocks_to_csv(df: pd.DataFrame, get_only_tickers=False, with_filters=Fa
         st.error(f"Błąd zapisu pliku: {e}")
 
 
+def save_stocks_chunks_to_csv(chunks, get_only_tickers=False, with_filters=False) -> int:
+    """
+    Zapisuje strumień DataFrame'ów (np. z iter_finviz_pages) do jednego pliku CSV, dopisując kolejne porcje.
+    Zwraca liczbę zapisanych wierszy.
+    """
+    full_path = None
+    saved_rows = 0
+    try:
+        for chunk in chunks:
+            if chunk is None or chunk.empty:
+                continue
+            path_dir, filename_suffix, df_to_save = _prepare_stocks_for_csv(chunk, get_only_tickers, with_filters)
+            if full_path is None:
+                os.makedirs(path_dir, exist_ok=True)
+                full_path = os.path.join(path_dir, filename_suffix)
+                df_to_save.to_csv(full_path, index=False)
+            else:
+                df_to_save.to_csv(full_path, index=False, header=False, mode="a")
+            saved_rows += len(df_to_save)
+    except Exception as e:
+        logging.error(f"Nie udało się zapisać pliku {full_path}. Błąd: {e}")
+        st.error(f"Błąd zapisu pliku: {e}")
+        return saved_rows
+
+    if full_path is None:
+        logging.warning("Otrzymano pusty strumień danych. Pomijam zapis do pliku.")
+    else:
+        logging.info(f"Zapisano strumieniowo {saved_rows} wierszy do: {full_path}")
+    return saved_rows
+
+
 def save_news_to_csv(df: pd.DataFrame, filename_prefix: str = "news_data") -> None:
     """Zapisuje newsy do pliku CSV"""
     if df.empty:
@@ -0,0 +1,101 @@
+# app/screener_query.py
+from dataclasses import dataclass, fields
+
+# Typowany model zapytania do screenera Finviz. Kompiluje się do parametru `f=`,
+# więc filtrowanie odbywa się po stronie Finviz i pobieramy tylko pasujące strony.
+
+MARKET_CAPS = {
+    "mega": "cap_mega", "large": "cap_large", "mid": "cap_mid", "small": "cap_small",
+    "micro": "cap_micro", "nano": "cap_nano",
+    "large+": "cap_largeover", "mid+": "cap_midover", "small+": "cap_smallover", "micro+": "cap_microover",
+}
+EXCHANGES = {"amex": "exch_amex", "nasd": "exch_nasd", "nyse": "exch_nyse"}
+SECTORS = {
+    "Basic Materials": "sec_basicmaterials",
+    "Communication Services": "sec_communicationservices",
+    "Consumer Cyclical": "sec_consumercyclical",
+    "Consumer Defensive": "sec_consumerdefensive",
+    "Energy": "sec_energy",
+    "Financial": "sec_financial",
+    "Healthcare": "sec_healthcare",
+    "Industrials": "sec_industrials",
+    "Real Estate": "sec_realestate",
+    "Technology": "sec_technology",
+    "Utilities": "sec_utilities",
+}
+# Progi "Over X" dostępne w Finviz; inne wartości idą jako zakres niestandardowy ("{min}to")
+AVG_VOLUME_PRESETS = (50, 100, 200, 300, 400, 500, 750, 1000, 2000)  # tys. sztuk
+PRICE_PRESETS = (1, 2, 3, 4, 5, 7, 10, 15, 20, 30, 40, 50, 60, 70, 80, 90, 100)
+REL_VOLUME_PRESETS = (0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10)
+
+
+def _num(value) -> str:
+    return f"{value:g}"
+
+
+def _range_filter(prefix: str, low, high, presets: tuple) -> str | None:
+    if low is None and high is None:
+        return None
+    if high is None and low in presets:
+        return f"{prefix}_o{_num(low)}"
+    return f"{prefix}_{_num(low) if low is not None else ''}to{_num(high) if high is not None else ''}"
+
+
+@dataclass(frozen=True)
+class ScreenerQuery:
+    """
+    Filtry screenera. Puste pola są pomijane.
+    Kapitalizacja: nazwa przedziału Finviz (`market_cap`, np. "mid") albo zakres w mld USD
+    (`min_market_cap` / `max_market_cap`). Średni wolumen w tysiącach sztuk.
+    """
+    market_cap: str | None = None
+    min_market_cap: float | None = None
+    max_market_cap: float | None = None
+    exchange: str | None = None
+    min_avg_volume: float | None = None
+    min_price: float | None = None
+    max_price: float | None = None
+    min_rel_volume: float | None = None
+    sector: str | None = None
+    country: str | None = None
+
+    def __post_init__(self):
+        if self.market_cap is not None and self.market_cap not in MARKET_CAPS:
+            raise ValueError(f"Nieznany przedział kapitalizacji: {self.market_cap}")
+        if self.exchange is not None and self.exchange not in EXCHANGES:
+            raise ValueError(f"Nieznana giełda: {self.exchange}")
+        if self.sector is not None and self.sector not in SECTORS:
+            raise ValueError(f"Nieznany sektor: {self.sector}")
+
+    def is_empty(self) -> bool:
+        return all(getattr(self, f.name) is None for f in fields(self))
+
+    def to_filters(self) -> list:
+        """Lista kodów filtrów Finviz, np. ["cap_mid", "exch_nasd", "sh_price_o5"]."""
+        filters = []
+        if self.market_cap is not None:
+            filters.append(MARKET_CAPS[self.market_cap])
+        elif (cap := _range_filter("cap", self.min_market_cap, self.max_market_cap, ())) is not None:
+            filters.append(cap)
+        if self.exchange is not None:
+            filters.append(EXCHANGES[self.exchange])
+        if self.min_avg_volume is not None:
+            filters.append(_range_filter("sh_avgvol", self.min_avg_volume, None, AVG_VOLUME_PRESETS))
+        if (price := _range_filter("sh_price", self.min_price, self.max_price, PRICE_PRESETS)) is not None:
+            filters.append(price)
+        if self.min_rel_volume is not None:
+            filters.append(_range_filter("sh_relvol", self.min_rel_volume, None, REL_VOLUME_PRESETS))
+        if self.sector is not None:
+            filters.append(SECTORS[self.sector])
+        if self.country is not None:
+            filters.append("geo_" + self.country.lower().replace(" ", ""))
+        return filters
+
+    def to_param(self) -> str:
+        """Parametr URL `&f=...` (pusty napis dla pustego zapytania)."""
+        filters = self.to_filters()
+        return "&f=" + ",".join(filters) if filters else ""
+
+
+# Dawne "Filtry" (URL_FILTERED): mid cap, NASDAQ, śr. wolumen > 500K, cena > 5$, rel. wolumen > 1.5
+MOMENTUM_QUERY = ScreenerQuery(market_cap="mid", exchange="nasd", min_avg_volume=500, min_price=5, min_rel_volume=1.5)
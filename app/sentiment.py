@@ -0,0 +1,178 @@
+# app/sentiment.py
+import os
+import re
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+# Ocena sentymentu nagłówków (VADER compound) z pamięcią wyników.
+# Analizator (ładowanie leksykonu) powstaje raz na proces. Wyniki są zapamiętywane w LRU po hashu
+# znormalizowanego tekstu i opcjonalnie w trwałym magazynie SQLite (SENTIMENT_STORE_PATH),
+# więc ten sam nagłówek zwrócony dla kilku tickerów albo przy kolejnym odświeżeniu liczymy tylko raz.
+
+CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", 100_000))
+STORE_PATH = os.getenv("SENTIMENT_STORE_PATH") or None
+# Od ilu nowych (niepoliczonych) tekstów rozkładamy liczenie na pulę procesów
+PROCESS_POOL_THRESHOLD = int(os.getenv("SENTIMENT_PROCESS_THRESHOLD", 20_000))
+PROCESS_CHUNK_SIZE = 2_000
+
+_WHITESPACE = re.compile(r"\s+")
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+
+def get_analyzer() -> SentimentIntensityAnalyzer:
+    """Zwraca współdzielony (procesowy) analizator VADER."""
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
+
+
+def normalize_text(text) -> str:
+    # Wielkość liter zostaje - VADER traktuje CAPS jako wzmocnienie
+    if text is None or text != text:  # None / NaN
+        return ""
+    return _WHITESPACE.sub(" ", str(text)).strip()
+
+
+def text_key(normalized: str) -> str:
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _score_chunk(texts: list) -> list:
+    """Liczy compound dla listy tekstów (także w procesach roboczych puli)."""
+    analyzer = get_analyzer()
+    return [analyzer.polarity_scores(t)["compound"] if t else 0.0 for t in texts]
+
+
+class SentimentStore:
+    """Trwały magazyn wyników (klucz -> compound) w SQLite."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sentiment (key TEXT PRIMARY KEY, score REAL NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, keys: list) -> dict:
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 900):  # limit parametrów SQLite
+                chunk = keys[i:i + 900]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT key, score FROM sentiment WHERE key IN ({placeholders})", chunk)
+                found.update(rows.fetchall())
+        return found
+
+    def put_many(self, items: dict) -> None:
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO sentiment (key, score) VALUES (?, ?)", items.items())
+            self._conn.commit()
+
+
+class SentimentService:
+    def __init__(self, cache_size: int = CACHE_SIZE, store_path: str | None = STORE_PATH,
+                 process_threshold: int = PROCESS_POOL_THRESHOLD):
+        self.cache_size = cache_size
+        self.process_threshold = process_threshold
+        self.store = None
+        if store_path:
+            try:
+                self.store = SentimentStore(store_path)
+            except sqlite3.Error as e:
+                logging.warning(f"[Sentyment] Nie udało się otworzyć magazynu {store_path}: {e}")
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cache_get_many(self, keys) -> dict:
+        found = {}
+        with self._lock:
+            for key in keys:
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                    found[key] = score
+        return found
+
+    def _cache_put_many(self, items: dict) -> None:
+        with self._lock:
+            for key, score in items.items():
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _compute(self, texts: list, processes: int | None) -> list:
+        if processes == 1 or len(texts) < self.process_threshold:
+            return _score_chunk(texts)
+        chunks = [texts[i:i + PROCESS_CHUNK_SIZE] for i in range(0, len(texts), PROCESS_CHUNK_SIZE)]
+        logging.info(f"[Sentyment] Liczę {len(texts)} tekstów w puli procesów ({len(chunks)} paczek)")
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return [score for chunk in executor.map(_score_chunk, chunks) for score in chunk]
+
+    def score_texts(self, texts, processes: int | None = None) -> np.ndarray:
+        """
+        Zwraca tablicę compound (float) w kolejności `texts`. Każdy unikalny tekst jest liczony
+        co najwyżej raz: najpierw LRU, potem magazyn, a dopiero brakujące trafiają do VADER
+        (powyżej `process_threshold` nowych tekstów - w puli `processes` procesów).
+        """
+        normalized = [normalize_text(t) for t in texts]
+        keys = [text_key(t) for t in normalized]
+        unique = dict(zip(keys, normalized))
+
+        scores = self._cache_get_many(unique)
+        missing = [k for k in unique if k not in scores]
+
+        if missing and self.store is not None:
+            stored = self.store.get_many(missing)
+            if stored:
+                scores.update(stored)
+                self._cache_put_many(stored)
+                missing = [k for k in missing if k not in stored]
+
+        self.hits += len(unique) - len(missing)
+        if missing:
+            self.misses += len(missing)
+            computed = dict(zip(missing, self._compute([unique[k] for k in missing], processes)))
+            scores.update(computed)
+            self._cache_put_many(computed)
+            if self.store is not None:
+                self.store.put_many(computed)
+
+        return np.fromiter((scores[k] for k in keys), dtype=float, count=len(keys))
+
+    def score(self, text) -> float:
+        return float(self.score_texts([text])[0])
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_sentiment_service() -> SentimentService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = SentimentService()
+    return _service
+
+
+def score_texts(texts, processes: int | None = None) -> np.ndarray:
+    return get_sentiment_service().score_texts(texts, processes=processes)
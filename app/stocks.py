@@ -1,10 +1,20 @@
+import argparse
+import itertools
 import logging
 import os
-import requests
+import re
+import threading
+import numpy as np
 import pandas as pd
-from bs4 import BeautifulSoup
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from app.save_data import save_stocks_to_csv
+from app import http_client
+from app.http_cache import CACHE_STORED_AT_HEADER
+from app.parsers import get_parser
+from app.screener_query import ScreenerQuery, MOMENTUM_QUERY, MARKET_CAPS, EXCHANGES, SECTORS
+from app.save_data import save_stocks_chunks_to_csv
 
 
 os.makedirs("logs", exist_ok=True)
@@ -20,10 +30,13 @@ HEADERS = {
 }
 
 URL_DEFAULT = "https://finviz.com/screener.ashx?v=111"
-URL_FILTERED = (
-    "https://finviz.com/screener.ashx?v=152&f=cap_mid,exch_nasd,sh_avgvol_o500,"
-    "sh_price_o5,sh_relvol_o1.5&c=1,2,3,4,5,6,7,20,42,43,57,58,64,67,65,66"
-)
+# Widok z własnym zestawem kolumn (COLUMNS_FILTERED), używany gdy podano ScreenerQuery
+URL_CUSTOM = "https://finviz.com/screener.ashx?v=152&c=1,2,3,4,5,6,7,20,42,43,57,58,64,67,65,66"
+URL_FILTERED = URL_CUSTOM + MOMENTUM_QUERY.to_param()
+# Widok "Tickers" - same symbole, do 1000 na stronę
+URL_TICKERS = "https://finviz.com/screener.ashx?v=411"
+TICKERS_PAGE_SIZE = 1000
+UNIVERSE_PATH = os.path.join("data", "tickers", "universe.npy")
 
 COLUMNS_NORMAL = [
     "No", "Ticker", "Company", "Sector", "Industry", "Country",
@@ -37,116 +50,363 @@ COLUMNS_FILTERED = [
 ]
 
 
-def fetch_finviz(max_companies: int = 10, get_only_tickers: bool = False, with_filters: bool = False) -> pd.DataFrame:
-    url = URL_FILTERED if with_filters else URL_DEFAULT
-    start_time = datetime.now()
-    all_data = []
-    start = 1
-    companies_fetched = 0
-    unlimited = max_companies is None or max_companies <= 0
-    columns = ["No", "Ticker"] if get_only_tickers else (COLUMNS_FILTERED if with_filters else COLUMNS_NORMAL)
-
-    while True:
-        if not unlimited and companies_fetched >= max_companies:
-            break
-
-        paged_url = url + f"&r={start}"
-        response = requests.get(paged_url, headers=HEADERS)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        rows = soup.find_all("tr", class_="styled-row")
-        if not rows:
-            break
-
-        for row in rows:
-            cols = row.find_all("td")
-            row_data = [col.get_text(strip=True) for col in cols]
-            if get_only_tickers:
-                all_data.append([row_data[0], row_data[1]])  # numer + ticker
-            else:
-                all_data.append(row_data[:len(columns)])
-            companies_fetched += 1
-            if not unlimited and companies_fetched >= max_companies:
+PAGE_SIZE = 20
+DEFAULT_CONCURRENCY = 4
+MAX_FAILED_PAGES = 3  # tyle nieudanych stron z rzędu toleruje scraper, zanim się podda
+
+_TOTAL_PATTERNS = (
+    re.compile(r"#\d+\s*/\s*([\d,]+)\s*Total"),
+    re.compile(r"Total:\s*(?:</?b>\s*)*([\d,]+)"),
+)
+
+
+def _fetch_screener_page(url: str, start: int, use_cache: bool = True) -> str:
+    """Pobiera pojedynczą stronę screenera zaczynającą się od wiersza `start`."""
+    response = http_client.get(url + f"&r={start}", headers=HEADERS, use_cache=use_cache)
+    response.raise_for_status()
+    return response.text
+
+
+def _parse_screener_total(html: str) -> int | None:
+    """Odczytuje łączną liczbę spółek ze strony screenera (None, jeśli nie ma licznika)."""
+    for pattern in _TOTAL_PATTERNS:
+        match = pattern.search(html)
+        if match:
+            return int(match.group(1).replace(",", ""))
+    return None
+
+
+def _parse_screener_rows(html: str, columns: list, get_only_tickers: bool) -> list:
+    if get_only_tickers:
+        return get_parser().screener_ticker_cells(html)  # numer + ticker, bez reszty komórek
+    return [row_data[:len(columns)] for row_data in get_parser().screener_rows(html)]
+
+
+def _iter_screener_pages(url: str, parse_page, max_rows: int | None, concurrency: int,
+                         page_size: int = PAGE_SIZE):
+    """
+    Generator stron screenera: zwraca listę wierszy dla każdej strony, w kolejności screenera.
+    W locie jest najwyżej `concurrency` zapytań. Pierwsza strona podaje łączną liczbę spółek,
+    więc wiemy, gdzie jest ostatnia strona; bez licznika kończymy na pierwszej niepełnej stronie.
+    """
+    first_html = _fetch_screener_page(url, 1)
+    rows = parse_page(first_html)
+    if max_rows:
+        rows = rows[:max_rows]
+    if rows:
+        yield rows
+    fetched = len(rows)
+    if fetched < page_size or (max_rows and fetched >= max_rows):
+        return
+
+    bounds = [b for b in (_parse_screener_total(first_html), max_rows) if b]
+    starts = itertools.count(1 + page_size, page_size)
+    if bounds:
+        starts = itertools.takewhile(lambda start: start <= min(bounds), starts)
+
+    def fetch_page(start):
+        # Harmonogram HTTP już ponawia 429/5xx; jeśli strona i tak się nie uda, pomijamy ją zamiast przerywać run.
+        try:
+            return parse_page(_fetch_screener_page(url, start))
+        except Exception as e:
+            logging.error(f"Pominięto stronę screenera r={start}: {e}")
+            return None
+
+    workers = max(1, concurrency)
+    failed_in_row = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque(pool.submit(fetch_page, start) for start in itertools.islice(starts, workers))
+        while pending:
+            page_rows = pending.popleft().result()
+            if page_rows is None:
+                failed_in_row += 1
+                if failed_in_row > MAX_FAILED_PAGES:
+                    logging.error(f"Przerwano pobieranie screenera po {failed_in_row} nieudanych stronach z rzędu.")
+                    for future in pending:
+                        future.cancel()
+                    break
+                next_start = next(starts, None)
+                if next_start is not None:
+                    pending.append(pool.submit(fetch_page, next_start))
+                continue
+            failed_in_row = 0
+            if max_rows:
+                page_rows = page_rows[:max_rows - fetched]
+            if page_rows:
+                fetched += len(page_rows)
+                yield page_rows
+            if len(page_rows) < page_size or (max_rows and fetched >= max_rows):
+                for future in pending:
+                    future.cancel()
                 break
-        start += 20
+            next_start = next(starts, None)
+            if next_start is not None:
+                pending.append(pool.submit(fetch_page, next_start))
 
-    df = pd.DataFrame(all_data, columns=columns)
-    df.fillna(pd.NA, inplace=True)
+
+def _screener_columns(get_only_tickers: bool, query: ScreenerQuery | None) -> list:
+    return ["No", "Ticker"] if get_only_tickers else (COLUMNS_FILTERED if query is not None else COLUMNS_NORMAL)
+
+
+def _screener_url(get_only_tickers: bool, query: ScreenerQuery | None) -> str:
+    """Bez zapytania - widok domyślny; z zapytaniem - widok z COLUMNS_FILTERED i filtrami po stronie Finviz."""
+    if query is None:
+        return URL_DEFAULT
+    # tryb tylko-tickery zostaje przy v=111, gdzie dwie pierwsze komórki to No i Ticker
+    return (URL_DEFAULT if get_only_tickers else URL_CUSTOM) + query.to_param()
+
+
+def iter_finviz_pages(max_companies: int = 10, get_only_tickers: bool = False, query: ScreenerQuery | None = None,
+                      concurrency: int = 1):
+    """
+    Strumieniowa wersja fetch_finviz: zwraca po jednym DataFrame na stronę screenera
+    (te same kolumny co fetch_finviz), więc czyszczenie i zapis mogą ruszyć przed końcem pobierania.
+    """
+    url = _screener_url(get_only_tickers, query)
+    unlimited = max_companies is None or max_companies <= 0
+    columns = _screener_columns(get_only_tickers, query)
+
+    pages = _iter_screener_pages(
+        url,
+        lambda html: _parse_screener_rows(html, columns, get_only_tickers),
+        max_rows=None if unlimited else max_companies,
+        concurrency=concurrency,
+    )
+    for page_rows in pages:
+        chunk = pd.DataFrame(page_rows, columns=columns)
+        chunk.fillna(pd.NA, inplace=True)
+        yield chunk
+
+
+def fetch_finviz(max_companies: int = 10, get_only_tickers: bool = False, query: ScreenerQuery | None = None,
+                 concurrency: int = 1) -> pd.DataFrame:
+    """
+    Pobiera dane ze screenera Finviz. `query` (ScreenerQuery) jest kompilowane do filtrów `f=`,
+    więc Finviz zwraca tylko pasujące spółki; bez zapytania pobierany jest widok domyślny.
+    """
+    start_time = datetime.now()
+    chunks = list(iter_finviz_pages(max_companies=max_companies, get_only_tickers=get_only_tickers,
+                                    query=query, concurrency=concurrency))
+    if chunks:
+        df = pd.concat(chunks, ignore_index=True)
+    else:
+        df = pd.DataFrame(columns=_screener_columns(get_only_tickers, query))
     finish = datetime.now()
-    logging.info(f"Pobrano {len(df)} spółek. Czas: {finish - start_time}")
+    logging.info(f"Pobrano {len(df)} spółek (równoległość: {concurrency}). Czas: {finish - start_time}")
     return df
 
 
-def fetch_finviz_for_ticker(ticker: str) -> pd.DataFrame:
+def fetch_ticker_universe(max_tickers: int = 0, query: ScreenerQuery | None = None,
+                          concurrency: int = DEFAULT_CONCURRENCY) -> np.ndarray:
     """
-    Pobiera dane dla pojedynczego tickera z Finviz.
-    Zwraca DataFrame z jedną linią danych.
+    Pobiera same symbole z widoku "Tickers" (do 1000 na stronę), parsując tylko komórki z tickerami.
+    Zwraca zwartą tablicę NumPy z symbolami w kolejności screenera.
     """
     start_time = datetime.now()
-    url = f"https://finviz.com/quote.ashx?t={ticker}"
+    url = URL_TICKERS + (query.to_param() if query is not None else "")
+    pages = _iter_screener_pages(
+        url,
+        get_parser().screener_tickers,
+        max_rows=max_tickers if max_tickers and max_tickers > 0 else None,
+        concurrency=concurrency,
+        page_size=TICKERS_PAGE_SIZE,
+    )
+    tickers = np.array([ticker for page in pages for ticker in page], dtype=str)
+    logging.info(f"Pobrano {len(tickers)} tickerów. Czas: {datetime.now() - start_time}")
+    return tickers
+
+
+def diff_ticker_universe(tickers: np.ndarray, path: str = UNIVERSE_PATH, update: bool = True) -> tuple:
+    """
+    Porównuje tickery z zapisanym wcześniej uniwersum. Zwraca (dodane, usunięte) jako tablice NumPy.
+    Przy `update=True` zapisuje `tickers` jako nowe uniwersum.
+    """
+    cached = np.load(path) if os.path.exists(path) else np.array([], dtype=str)
+    added = np.setdiff1d(tickers, cached)
+    removed = np.setdiff1d(cached, tickers)
+    if update:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(path, tickers)
+    logging.info(f"Uniwersum tickerów: {len(tickers)} (+{len(added)} / -{len(removed)})")
+    return added, removed
+
+
+QUOTE_URL = "https://finviz.com/quote.ashx?t={ticker}"
+QUOTE_SNAPSHOT_TTL = 60  # s - w tym oknie kolejne widoki tego samego tickera nie pobierają strony ponownie
 
-    response = requests.get(url, headers=HEADERS)
+# Pola snapshotu mapowane na kolumny fetch_finviz
+_SNAPSHOT_COLUMNS = ["Company", "Sector", "Industry", "Country", "Market Cap", "P/E", "Price", "Change", "Volume"]
+
+
+@dataclass(frozen=True, slots=True)
+class QuoteSnapshot:
+    """
+    Jedno pobranie i jedno parsowanie strony quote.ashx: wszystkie pola snapshot-table2 + bieżąca cena.
+    `fetched_at` to czas pobrania strony z sieci (dla odpowiedzi z cache - czas zapisu wpisu).
+    """
+    ticker: str
+    price: float | None
+    fields: dict
+    fetched_at: datetime
+
+    def get(self, key: str, default=pd.NA):
+        return self.fields.get(key, default)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Widok w kolumnach fetch_finviz (COLUMNS_NORMAL), jeden wiersz."""
+        row = {"Ticker": self.ticker, **{col: self.get(col) for col in _SNAPSHOT_COLUMNS}}
+        if pd.isna(row["Price"]) and self.price is not None:
+            row["Price"] = f"{self.price:.2f}"
+        return pd.DataFrame([row], columns=COLUMNS_NORMAL)
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def fetch_quote_snapshot(ticker: str, max_age: float = QUOTE_SNAPSHOT_TTL, use_cache: bool = True) -> QuoteSnapshot:
+    """
+    Pobiera i parsuje stronę quote.ashx raz; świeży wynik (młodszy niż `max_age` s) jest
+    zwracany z pamięci procesu, więc np. kolejne widoki analizy tego samego tickera dzielą jedno zapytanie.
+    Z `use_cache=False` strona jest zawsze pobierana z sieci (z pominięciem pamięci i cache dyskowego).
+    """
+    ticker = ticker.strip().upper()
+    with _snapshots_lock:
+        snapshot = _snapshots.get(ticker)
+    if use_cache and snapshot is not None and (datetime.now() - snapshot.fetched_at).total_seconds() < max_age:
+        return snapshot
+
+    response = http_client.get(QUOTE_URL.format(ticker=ticker), headers=HEADERS, use_cache=use_cache)
     response.raise_for_status()
-    soup = BeautifulSoup(response.text, "html.parser")
+    fields, price = get_parser().quote_page(response.text)
+    # odpowiedź z dyskowego cache ma czas zapisu - snapshot nie może udawać świeższego, niż jest
+    stored_at = response.headers.get(CACHE_STORED_AT_HEADER)
+    fetched_at = datetime.fromtimestamp(float(stored_at)) if stored_at else datetime.now()
+    snapshot = QuoteSnapshot(ticker=ticker, price=price, fields=fields, fetched_at=fetched_at)
+    if fields or price is not None:
+        with _snapshots_lock:
+            _snapshots[ticker] = snapshot
+    return snapshot
+
 
-    table = soup.find("table", class_="snapshot-table2")
-    if not table:
+def fetch_finviz_for_ticker(ticker: str) -> pd.DataFrame:
+    """
+    Pobiera dane dla pojedynczego tickera z Finviz.
+    Zwraca DataFrame z jedną linią danych.
+    """
+    start_time = datetime.now()
+    snapshot = fetch_quote_snapshot(ticker)
+    if not snapshot.fields:
         logging.warning(f"Nie znaleziono danych dla tickera {ticker}")
         return pd.DataFrame(columns=COLUMNS_NORMAL)
 
-    cells = table.find_all("td")
-    data_dict = {}
-    for i in range(0, len(cells), 2):
-        key = cells[i].get_text(strip=True)
-        value = cells[i + 1].get_text(strip=True)
-        data_dict[key] = value
-
-    # Mapujemy dane Finviz do naszych kolumn
-    mapped_data = {
-        "Ticker": ticker,
-        "Company": data_dict.get("Company", pd.NA),
-        "Sector": data_dict.get("Sector", pd.NA),
-        "Industry": data_dict.get("Industry", pd.NA),
-        "Country": data_dict.get("Country", pd.NA),
-        "Market Cap": data_dict.get("Market Cap", pd.NA),
-        "P/E": data_dict.get("P/E", pd.NA),
-        "Price": data_dict.get("Price", pd.NA),
-        "Change": data_dict.get("Change", pd.NA),
-        "Volume": data_dict.get("Volume", pd.NA)
-    }
-
-    df = pd.DataFrame([mapped_data], columns=COLUMNS_NORMAL)
+    df = snapshot.to_frame()
     finish = datetime.now()
     logging.info(f"Pobrano dane dla {ticker}. Czas: {finish - start_time}")
     return df
 
+
 def get_current_price(ticker: str) -> float | None:
     """
     Pobiera aktualną cenę danej spółki z Finviz (dostosowane do nowej struktury HTML)
-    Zwraca float lub None, jeśli coś pójdzie nie tak.
+    Zwraca float lub None, jeśli coś pójdzie nie tak. Cena jest zawsze pobierana z sieci, bez cache.
     """
     try:
-        url = f"https://finviz.com/quote.ashx?t={ticker.upper()}"
-        response = requests.get(url, headers=HEADERS, timeout=5)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
+        return fetch_quote_snapshot(ticker, use_cache=False).price
+    except Exception as e:
+        logging.warning(f"Nie udało się pobrać ceny dla {ticker}: {e}")
+        return None
 
-        price_tag = soup.find("strong", class_="quote-price_wrapper_price")
-        if price_tag and price_tag.text:
-            price_str = price_tag.text.strip().replace("$", "").replace(",", "")
-            return float(price_str)
 
-        price_cells = soup.find_all("td", class_="snapshot-td2")
-        for cell in price_cells:
-            if "$" in cell.text:
-                return float(cell.text.replace("$", "").replace(",", ""))
+def _normalize_tickers(tickers) -> list:
+    """Usuwa duplikaty i puste wartości, zachowując kolejność (tickery wielkimi literami)."""
+    return list(dict.fromkeys(t.strip().upper() for t in tickers if t and t.strip()))
 
-        return None
 
-    except Exception:
-        return None
+def _fetch_screener_for_tickers(tickers: list, use_cache: bool = True) -> list:
+    """Jedno zapytanie do screenera z filtrem listy tickerów (do PAGE_SIZE tickerów)."""
+    html = _fetch_screener_page(URL_DEFAULT + "&t=" + ",".join(tickers), 1, use_cache=use_cache)
+    return _parse_screener_rows(html, COLUMNS_NORMAL, get_only_tickers=False)
+
+
+def fetch_finviz_for_tickers(tickers, concurrency: int = DEFAULT_CONCURRENCY,
+                            use_cache: bool = True) -> pd.DataFrame:
+    """
+    Pobiera wiersze screenera (kolumny jak w fetch_finviz) dla listy tickerów,
+    po PAGE_SIZE tickerów na jedno zapytanie. Tickery nieznane screenerowi są pomijane.
+    Z `use_cache=False` zapytania omijają dyskowy cache odpowiedzi.
+    """
+    tickers = _normalize_tickers(tickers)
+    if not tickers:
+        return pd.DataFrame(columns=COLUMNS_NORMAL)
+
+    batches = [tickers[i:i + PAGE_SIZE] for i in range(0, len(tickers), PAGE_SIZE)]
+    rows = []
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches)))) as pool:
+        futures = {pool.submit(_fetch_screener_for_tickers, batch, use_cache): batch for batch in batches}
+        for future, batch in futures.items():
+            try:
+                rows.extend(future.result())
+            except Exception as e:
+                logging.warning(f"Nie udało się pobrać screenera dla {','.join(batch)}: {e}")
+
+    df = pd.DataFrame(rows, columns=COLUMNS_NORMAL)
+    df.fillna(pd.NA, inplace=True)
+    return df
+
+
+def get_current_prices(tickers, concurrency: int = DEFAULT_CONCURRENCY) -> tuple:
+    """
+    Aktualne ceny dla wielu tickerów naraz. Zwraca (słownik ticker -> cena lub None, czas pobrania).
+    Ceny bierzemy ze screenera (PAGE_SIZE tickerów na zapytanie); tylko tickery, których
+    screener nie zwrócił, są dociągane równolegle ze stron quote.ashx. Wszystkie zapytania idą
+    do sieci z pominięciem cache, więc `fetched_at` to rzeczywisty czas notowań.
+    """
+    tickers = _normalize_tickers(tickers)
+    fetched_at = datetime.now()
+    prices = {}
+
+    df = fetch_finviz_for_tickers(tickers, concurrency=concurrency, use_cache=False)
+    for ticker, price in zip(df["Ticker"], df["Price"]):
+        try:
+            prices[ticker] = float(str(price).replace(",", ""))
+        except ValueError:
+            continue
+
+    missing = [t for t in tickers if t not in prices]
+    if missing:
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(missing)))) as pool:
+            prices.update(zip(missing, pool.map(get_current_price, missing)))
+
+    logging.info(f"Pobrano ceny dla {len(tickers)} tickerów ({len(missing)} ze stron quote). "
+                 f"Czas: {datetime.now() - fetched_at}")
+    return {t: prices.get(t) for t in tickers}, fetched_at
 
 
 if __name__ == "__main__":
-    df = fetch_finviz(max_companies=100, with_filters=False, get_only_tickers=False)
-    save_stocks_to_csv(df, with_filters=False, get_only_tickers=False)
+    parser = argparse.ArgumentParser(description="Pobiera dane ze screenera Finviz i zapisuje je do CSV.")
+    parser.add_argument("--max-companies", type=int, default=100, help="Limit spółek (0 = wszystkie)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maksymalna liczba równoległych zapytań do Finviz")
+    parser.add_argument("--only-tickers", action="store_true", help="Pobierz tylko tickery")
+    parser.add_argument("--filters", action="store_true", help="Użyj predefiniowanych filtrów (MOMENTUM_QUERY)")
+    parser.add_argument("--cap", choices=list(MARKET_CAPS), help="Przedział kapitalizacji")
+    parser.add_argument("--exchange", choices=list(EXCHANGES), help="Giełda")
+    parser.add_argument("--min-avg-volume", type=float, help="Minimalny średni wolumen (tys. sztuk)")
+    parser.add_argument("--min-price", type=float, help="Minimalna cena")
+    parser.add_argument("--max-price", type=float, help="Maksymalna cena")
+    parser.add_argument("--min-rel-volume", type=float, help="Minimalny relatywny wolumen")
+    parser.add_argument("--sector", choices=list(SECTORS), help="Sektor")
+    args = parser.parse_args()
+
+    query = MOMENTUM_QUERY if args.filters else ScreenerQuery(
+        market_cap=args.cap, exchange=args.exchange, min_avg_volume=args.min_avg_volume,
+        min_price=args.min_price, max_price=args.max_price, min_rel_volume=args.min_rel_volume,
+        sector=args.sector,
+    )
+    if query.is_empty():
+        query = None
+
+    chunks = iter_finviz_pages(max_companies=args.max_companies, query=query,
+                               get_only_tickers=args.only_tickers, concurrency=args.concurrency)
+    save_stocks_chunks_to_csv(chunks, with_filters=query is not None, get_only_tickers=args.only_tickers)
@@ -1,20 +1,5 @@
 import pandas as pd
-
-def convert_market_cap(value):
-    if pd.isna(value):
-        return None
-    value = str(value).replace(",", "").strip()  # usuń przecinki i spacje
-    try:
-        if value.endswith('B'):
-            return float(value[:-1]) * 1e9
-        elif value.endswith('M'):
-            return float(value[:-1]) * 1e6
-        elif value.endswith('K'):
-            return float(value[:-1]) * 1e3
-        else:
-            return float(value)
-    except:
-        return None
+from app.finviz_values import parse_finviz_frame
 
 # przykładowe dane
 df = pd.DataFrame({
@@ -30,12 +15,8 @@ df = pd.DataFrame({
     "Volume": ["1,239,904"]
 })
 
-# konwersja Market Cap
-df["market_cap"] = df["Market Cap"].apply(convert_market_cap)
-df["Volume"] = df["Volume"].str.replace(",", "").astype(float)
-df["Change"] = df["Change"].str.replace("%", "").astype(float)
-
-# usuń starą kolumnę
-df.drop(columns=["Market Cap"], inplace=True)
+# konwersja wszystkich kolumn liczbowych (Market Cap, Volume, Change, ...) w jednym przebiegu
+df = parse_finviz_frame(df)
+df.rename(columns={"Market Cap": "market_cap"}, inplace=True)
 
 print(df)
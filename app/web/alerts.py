@@ -2,7 +2,7 @@
 
 import streamlit as st
 from .supabase_client import supabase
-from ..stocks import get_current_price
+from ..stocks import get_current_price, get_current_prices
 import math
 
 ALERTS_CSS = """
@@ -136,16 +136,27 @@ def check_price(ticker: str):
         return None
 
 
-def render_styled_alert_card(alert) -> str:
+def check_prices(tickers: list) -> dict:
+    """Pobiera aktualne ceny dla wielu tickerów jednym wywołaniem (ticker -> cena lub None)."""
+    try:
+        prices, _ = get_current_prices(tickers)
+        return prices
+    except Exception as e:
+        st.error(f"Błąd podczas pobierania cen: {e} alerts.py")
+        return {}
+
+
+def render_styled_alert_card(alert, prices: dict | None = None) -> str:
     """
     Zwraca HTML dla karty alertu (używane w pętli).
+    Jeśli podano `prices` (np. z check_prices), cena nie jest pobierana osobno dla każdej karty.
     """
     ticker = alert.get('ticker', '---')
     low = alert.get('threshold_low')
     high = alert.get('threshold_high')
     current = None
     try:
-        current = check_price(ticker)
+        current = prices.get(ticker.upper()) if prices is not None else check_price(ticker)
     except Exception:
         current = None
 
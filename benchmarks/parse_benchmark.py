@@ -0,0 +1,60 @@
+# benchmarks/parse_benchmark.py
+"""
+Porównuje przepustowość backendów parsujących (app/parsers.py) na zapisanych stronach Finviz.
+
+Uruchomienie z katalogu głównego repozytorium:
+    python benchmarks/parse_benchmark.py --repeat 200
+"""
+import os
+import sys
+import argparse
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.parsers import available_parsers, get_parser
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# (plik, metoda backendu) - po jednej stronie każdego typu
+CASES = [
+    ("finviz_screener_v111.html", "screener_rows"),
+    ("finviz_screener_v111.html", "screener_ticker_cells"),
+    ("finviz_screener_v411.html", "screener_tickers"),
+    ("finviz_quote_AAPL.html", "snapshot_table"),
+    ("finviz_quote_AAPL.html", "quote_price"),
+    ("finviz_quote_AAPL.html", "quote_page"),
+]
+
+
+def run(repeat: int, parsers: list) -> None:
+    print(f"{'strona':<28} {'metoda':<22} {'backend':<8} {'strony/s':>10} {'MB/s':>8}")
+    for filename, method in CASES:
+        with open(os.path.join(FIXTURES_DIR, filename), encoding="utf-8") as f:
+            html = f.read()
+        size_mb = len(html.encode("utf-8")) / 1_000_000
+
+        results = {}
+        for name in parsers:
+            parse = getattr(get_parser(name), method)
+            results[name] = parse(html)  # rozgrzewka + wynik do porównania
+
+            start = time.perf_counter()
+            for _ in range(repeat):
+                parse(html)
+            elapsed = time.perf_counter() - start
+
+            print(f"{filename:<28} {method:<22} {name:<8} {repeat / elapsed:>10.1f} {repeat * size_mb / elapsed:>8.2f}")
+
+        outputs = list(results.values())
+        if any(output != outputs[0] for output in outputs[1:]):
+            print(f"  UWAGA: backendy zwracają różne wyniki dla {filename} / {method}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parserów HTML dla stron Finviz.")
+    parser.add_argument("--repeat", type=int, default=100, help="Ile razy parsować każdą stronę")
+    parser.add_argument("--parsers", nargs="*", default=None, help="Backendy do porównania (domyślnie wszystkie)")
+    args = parser.parse_args()
+
+    run(args.repeat, args.parsers or available_parsers())
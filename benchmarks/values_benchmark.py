@@ -0,0 +1,90 @@
+# benchmarks/values_benchmark.py
+"""
+Porównuje wektorowe parsowanie wartości Finviz (app/finviz_values.py) z dawnym .apply wiersz po wierszu.
+
+Uruchomienie z katalogu głównego repozytorium:
+    python benchmarks/values_benchmark.py --rows 10000 1000000
+"""
+import os
+import sys
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.finviz_values import parse_finviz_frame
+
+# Przykładowe wartości każdego typu kolumny (w tym braki "-" i sufiks T)
+SAMPLES = {
+    "Market Cap": ["35.26B", "812.40M", "3.12T", "950.00K", "-"],
+    "P/E": ["29.17", "-", "1,204.50", "8.03", "15.2"],
+    "Price": ["124.38", "5.01", "1,050.00", "0.87", "42"],
+    "Change": ["-1.24%", "0.00%", "12.50%", "-", "3.1%"],
+    "Volume": ["1,239,904", "15,002", "98,112,457", "-", "700"],
+}
+
+
+def make_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({col: np.array(values, dtype=object)[rng.integers(0, len(values), rows)]
+                         for col, values in SAMPLES.items()})
+
+
+def clean_numeric(value):
+    """Dawna implementacja z clean_and_transform_for_db (punkt odniesienia)."""
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = value.strip().replace(',', '')
+        if value.endswith('B'): return float(value[:-1]) * 1e9
+        if value.endswith('M'): return float(value[:-1]) * 1e6
+        if value.endswith('K'): return float(value[:-1]) * 1e3
+        if value.endswith('%'): return float(value[:-1])
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def parse_rowwise(df: pd.DataFrame) -> pd.DataFrame:
+    parsed = df.copy()
+    for col in parsed.columns:
+        parsed[col] = parsed[col].apply(clean_numeric)
+    parsed["Volume"] = parsed["Volume"].apply(lambda x: int(x) if x is not None and x == x else None)
+    return parsed
+
+
+def timed(func, df: pd.DataFrame, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(rows_list: list, repeat: int, rowwise_limit: int) -> None:
+    print(f"{'wiersze':>10} {'metoda':<12} {'czas [s]':>10} {'wiersze/s':>14}")
+    for rows in rows_list:
+        df = make_frame(rows)
+        cases = [("wektorowo", parse_finviz_frame)]
+        if rows <= rowwise_limit:
+            cases.append(("apply", parse_rowwise))
+        for name, func in cases:
+            elapsed = timed(func, df, repeat)
+            print(f"{rows:>10} {name:<12} {elapsed:>10.4f} {rows / elapsed:>14,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parsowania wartości liczbowych Finviz.")
+    parser.add_argument("--rows", type=int, nargs="*", default=[10_000, 1_000_000], help="Liczby wierszy")
+    parser.add_argument("--repeat", type=int, default=3, help="Ile powtórzeń (liczy się najlepszy czas)")
+    parser.add_argument("--rowwise-limit", type=int, default=1_000_000,
+                        help="Powyżej tej liczby wierszy pomija wolną wersję .apply")
+    args = parser.parse_args()
+
+    run(args.rows, args.repeat, args.rowwise_limit)
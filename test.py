@@ -1,10 +1,12 @@
-from stocks import get_current_price
+from stocks import get_current_prices
 
 tickers = ["AAPL", "TSLA", "NVDA"]
 
+prices, fetched_at = get_current_prices(tickers)
+print(f"Ceny z {fetched_at:%H:%M:%S}")
 for t in tickers:
-    price = get_current_price(t)
+    price = prices.get(t)
     if price is not None:
         print(f"{t}: ${price}")
     else:
-        print(f"{t}: nie ma")
+        print(f"{t}: nie ma")
\ No newline at end of file
@@ -0,0 +1,62 @@
+# tests/test_stocks_cache.py
+import os
+from datetime import date
+
+import pyarrow as pa
+
+from app.db import stocks_cache
+from app.db.stocks_loader import typed_stocks_frame
+
+
+class FakeClient:
+    supabase_url = "https://example.supabase.co"
+
+
+def _row(day: date, volume, company="Apple Inc"):
+    return {"ticker": "AAPL", "company": company, "price": 100.0, "market_cap": 1e12,
+            "volume": volume, "change": 1.5, "p_e": 30.0, "import_date": day.isoformat()}
+
+
+def _write_days(client, rows_by_day: dict) -> str:
+    directory = stocks_cache._project_dir(client)
+    os.makedirs(directory, exist_ok=True)
+    for day, rows in rows_by_day.items():
+        stocks_cache._write_partition(directory, day, typed_stocks_frame(rows, stocks_cache.CACHE_COLUMNS))
+    return directory
+
+
+def test_partitions_with_and_without_nulls_read_together(tmp_path, monkeypatch):
+    monkeypatch.setattr(stocks_cache, "CACHE_DIR", str(tmp_path))
+    client = FakeClient()
+    first, second = date(2026, 10, 13), date(2026, 10, 14)
+    _write_days(client, {
+        first: [_row(first, 100)],
+        second: [_row(second, None, company=None)],  # volume z nullem, kolumna tekstowa z samych None
+    })
+
+    df = stocks_cache.read_stocks_cache(client)
+
+    assert len(df) == 2
+    assert df["volume"].dtype == "float64"
+    assert df["volume"].iloc[0] == 100
+    assert df["volume"].isna().iloc[1]
+    assert list(df["import_date"]) == [first, second]
+
+
+def test_partition_written_with_inferred_schema_is_cast_on_read(tmp_path, monkeypatch):
+    monkeypatch.setattr(stocks_cache, "CACHE_DIR", str(tmp_path))
+    client = FakeClient()
+    old_day, new_day = date(2026, 10, 12), date(2026, 10, 13)
+    directory = _write_days(client, {new_day: [_row(new_day, None)]})
+
+    # partycja w starym formacie: typy wywnioskowane z danych (volume int64, company jako null)
+    legacy = pa.Table.from_pandas(
+        typed_stocks_frame([_row(old_day, 50, company=None)], stocks_cache.CACHE_COLUMNS), preserve_index=False)
+    with pa.OSFile(stocks_cache._partition_path(directory, old_day), "wb") as sink, \
+            pa.ipc.new_file(sink, legacy.schema) as writer:
+        writer.write_table(legacy)
+
+    df = stocks_cache.read_stocks_cache(client, columns=["ticker", "volume", "import_date"])
+
+    assert list(df["volume"].fillna(-1)) == [50.0, -1.0]
+    assert list(df["import_date"]) == [old_day, new_day]
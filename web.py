@@ -10,15 +10,19 @@ from pymongo.uri_parser import parse_uri
 # --- Importy z projektu ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.stocks import fetch_finviz
-from app.news import fetch_google_news_rss, add_sentiment
+from app.stocks import fetch_finviz, iter_finviz_pages, DEFAULT_CONCURRENCY
+from app.screener_query import ScreenerQuery, MOMENTUM_QUERY, MARKET_CAPS, EXCHANGES, SECTORS
+from app.news import fetch_google_news_rss, add_sentiment, fetch_news_for_tickers
 from app.predictive_model import initialize_clients, process_historical_analysis, analyze_single_ticker, \
     display_top_stocks_card_view
 from app.web.auth import login, logout, register, check_login
 from app.web.watchlist import get_watchlist, add_to_watchlist, remove_from_watchlist
-from app.web.alerts import get_alerts, add_alert, remove_alert, ALERTS_CSS, render_styled_alert_card
-from app.db.user_supabase_manager import clean_and_transform_for_db, SupabaseHandler
+from app.web.alerts import get_alerts, add_alert, remove_alert, ALERTS_CSS, render_styled_alert_card, check_prices
+from app.db.user_supabase_manager import clean_and_transform_for_db, iter_clean_and_transform_for_db, \
+    SupabaseHandler
 from app.db.user_mongodb_manager import MongoNewsHandler
+from app.db.mongo_clients import ping as mongo_ping
+from app.db.stocks_cache import project_key
 from app.load_demo_data import load_demo_secrets
 from app.helpers import sql_script_help, filters_help
 
@@ -246,6 +250,8 @@ def render_config_expander():
                     db_name = parse_uri(mongo_uri_to_use).get('database')
                     if not db_name:
                         st.error("URI musi zawierać nazwę bazy danych")
+                    elif not mongo_ping(mongo_uri_to_use):
+                        st.error("Nie udało się połączyć z MongoDB (ping). Sprawdź URI i dostęp sieciowy.")
                     else:
                         st.session_state.update({
                             "mongo_uri": mongo_uri_to_use,
@@ -263,15 +269,53 @@ def render_config_expander():
 def display_stocks_tab():
     st.markdown("[🌐 Otwórz Finviz Screener](https://finviz.com/screener.ashx?v=111)", unsafe_allow_html=True)
     with st.form("finviz_form"):
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         max_companies = col1.number_input("Maksymalna ilość spółek (0 = wszystkie)", min_value=0, value=50, step=10)
-        get_only_tickers = col2.checkbox("Tylko tickery", value=False)
-        with_filters = col3.checkbox("Filtry", value=False, help=filters_help)
+        concurrency = col2.number_input("Równoległe zapytania", min_value=1, max_value=16,
+                                        value=DEFAULT_CONCURRENCY, step=1,
+                                        help="Ile stron screenera pobierać jednocześnie")
+        get_only_tickers = col3.checkbox("Tylko tickery", value=False)
+        use_preset = col4.checkbox("Preset Momentum", value=False, help=filters_help)
+        with st.expander("Własne filtry screenera (stosowane po stronie Finviz)"):
+            f1, f2, f3 = st.columns(3)
+            cap = f1.selectbox("Kapitalizacja", ["-"] + list(MARKET_CAPS))
+            exchange = f2.selectbox("Giełda", ["-"] + list(EXCHANGES))
+            sector = f3.selectbox("Sektor", ["-"] + list(SECTORS))
+            f4, f5, f6 = st.columns(3)
+            min_avg_volume = f4.number_input("Min. średni wolumen (tys.)", min_value=0, value=0, step=100)
+            min_price = f5.number_input("Min. cena", min_value=0.0, value=0.0, step=1.0)
+            min_rel_volume = f6.number_input("Min. relatywny wolumen", min_value=0.0, value=0.0, step=0.5)
+        stream_save = st.checkbox("Zapisuj do Supabase w trakcie pobierania", value=False,
+                                  disabled=not st.session_state.get("db_configured"),
+                                  help="Każda strona screenera jest czyszczona i zapisywana zaraz po pobraniu")
         if st.form_submit_button("🔄 Pobierz dane giełdowe", type="primary", use_container_width=True):
+            query = MOMENTUM_QUERY if use_preset else ScreenerQuery(
+                market_cap=None if cap == "-" else cap,
+                exchange=None if exchange == "-" else exchange,
+                sector=None if sector == "-" else sector,
+                min_avg_volume=min_avg_volume or None,
+                min_price=min_price or None,
+                min_rel_volume=min_rel_volume or None,
+            )
+            fetch_args = dict(max_companies=max_companies, get_only_tickers=get_only_tickers,
+                              query=None if query.is_empty() else query, concurrency=int(concurrency))
             with st.spinner("Pobieram dane z Finviz..."):
                 try:
-                    df = fetch_finviz(max_companies=max_companies, get_only_tickers=get_only_tickers,
-                                      with_filters=with_filters)
+                    if stream_save:
+                        # pobieranie, czyszczenie i zapis idą równolegle, strona po stronie
+                        sb_handler = SupabaseHandler(st.session_state["sb_url"], st.session_state["sb_api"])
+                        pages = []
+
+                        def collect(chunks):
+                            for chunk in chunks:
+                                pages.append(chunk)
+                                yield chunk
+
+                        sb_handler.save_dataframes(iter_clean_and_transform_for_db(
+                            collect(iter_finviz_pages(**fetch_args))))
+                        df = pd.concat(pages, ignore_index=True) if pages else pd.DataFrame()
+                    else:
+                        df = fetch_finviz(**fetch_args)
                     st.session_state["latest_df"] = df
                 except Exception as e:
                     st.error(f"Nie udało się pobrać danych: {e}")
@@ -289,11 +333,8 @@ def display_stocks_tab():
                 with st.spinner("Przygotowuję i zapisuję dane do Supabase..."):
                     sb_handler = SupabaseHandler(st.session_state["sb_url"], st.session_state["sb_api"])
                     df_cleaned = clean_and_transform_for_db(df)
-                    saved_count = sb_handler.save_dataframe(df_cleaned)
-                    if saved_count > 0:
-                        st.success(f"✅ Zapisano {saved_count} rekordów do Supabase!")
-                    else:
-                        st.error("❌ Zapis do Supabase nie powiódł się. Sprawdź logi lub konfigurację bazy.")
+                    # komunikat o wyniku (również o pominiętych, niezmienionych wierszach) wyświetla handler
+                    sb_handler.save_dataframe(df_cleaned)
         with col2:
             csv_data = convert_df_to_csv(df)
             st.download_button(label="📥 Pobierz jako CSV", data=csv_data, file_name="finviz_stocks.csv",
@@ -369,14 +410,12 @@ def display_news_tab(user_id, is_guest=False):
 
             st.info("Rozpoczynanie pobierania newsów i analizy sentymentu")
             progress_bar = st.progress(0, text="Rozpoczęto")
-            all_news = []
-            for i, t in enumerate(tickers_list):
-                progress_bar.progress((i + 1) / len(tickers_list),
-                                      text=f"Przetwarzanie: {t} ({i + 1}/{len(tickers_list)})")
-                df_news = fetch_google_news_rss(t, limit=limit)
-                if df_news is not None and not df_news.empty:
-                    df_news_sentiment = add_sentiment(df_news)
-                    all_news.extend(df_news_sentiment.to_dict(orient="records"))
+
+            def update_progress(done, total, t):
+                progress_bar.progress(done / total, text=f"Przetworzono: {t} ({done}/{total})")
+
+            df_all_news = fetch_news_for_tickers(tickers_list, limit=limit, progress=update_progress)
+            all_news = df_all_news.to_dict(orient="records")
 
             if all_news:
                 st.button("💾 Zapisz do MongoDB", key="save_mongo", use_container_width=True)
@@ -415,7 +454,8 @@ def display_model_tab():
 
     st.header("Ranking Potencjału Wzrostu (Analiza Historyczna)", anchor=False)
     with st.spinner("Przetwarzam dane historyczne..."):
-        result_df = process_historical_analysis(supabase_client, news_collection)
+        result_df = process_historical_analysis(supabase_client, news_collection,
+                                                project=project_key(supabase_client))
 
     if not result_df.empty:
         st.dataframe(result_df, use_container_width=True)
@@ -509,10 +549,11 @@ def display_alerts_tab(user_id, is_guest):
     if alerts:
         st.markdown("---")
         st.markdown("##### Aktywne Alerty")
+        prices = check_prices([alert['ticker'] for alert in alerts])
         for alert in alerts:
             col_card, col_btn = st.columns([1, 0.2])
             with col_card:
-                st.markdown(render_styled_alert_card(alert), unsafe_allow_html=True)
+                st.markdown(render_styled_alert_card(alert, prices), unsafe_allow_html=True)
             with col_btn:
                 if st.button("❌ Usuń", key=f"del_alert_{alert['id']}", use_container_width=True):
                     remove_alert(alert['id'], user_id)